@@ -0,0 +1,297 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src', 'src')
+sys.path.insert(0, os.path.abspath(SRC_DIR))
+
+TREE_DIR = 'tree'
+OPERATIONS = ['backup', 'restore', 'tree', 'copy', 'zip', 'unzip']
+# Metrics where a higher value is better; everything else is compared as lower-is-better.
+HIGHER_IS_BETTER = {'files_per_s', 'mb_per_s'}
+COMPARED_METRICS = ['files_per_s', 'mb_per_s', 'peak_rss_kb']
+# Operations that read the output of an earlier one, and the file they read.
+INPUTS = {'restore': ('backup', 'backup.txt'), 'unzip': ('zip', 'tree.zip')}
+
+WORDS = ['def', 'class', 'return', 'import', 'self', 'value', 'backup', 'restore', 'file', 'path',
+         'size', 'data', 'for', 'in', 'if', 'else', 'None', 'True', 'False', 'print', 'log']
+
+
+def make_text(rng, size):
+    parts = []
+    length = 0
+    while length < size:
+        line = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 12))) + '\n'
+        parts.append(line)
+        length += len(line)
+    return ''.join(parts)[:size].encode('utf-8')
+
+
+def make_binary(rng, size):
+    return rng.randbytes(size)
+
+
+def make_tree(root, seed=0, scale=1.0):
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+
+    def write(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    tiny_count = max(1, int(2000 * scale))
+    for i in range(tiny_count):
+        folder = os.path.join(root, 'tiny', f"d{i % 50:02d}")
+        size = rng.randint(64, 4096)
+        if i % 4 == 0:
+            write(os.path.join(folder, f"blob{i:05d}.bin"), make_binary(rng, size))
+        else:
+            write(os.path.join(folder, f"file{i:05d}.py"), make_text(rng, size))
+
+    huge_size = max(1, int(32 * 1024 * 1024 * scale))
+    write(os.path.join(root, 'huge', 'large_text.log'), make_text(rng, huge_size // 4) * 4)
+    write(os.path.join(root, 'huge', 'large_binary.img'), make_binary(rng, huge_size))
+
+    deep = os.path.join(root, 'deep')
+    for depth in range(max(1, int(30 * min(scale, 1.0)))):
+        deep = os.path.join(deep, f"level{depth:02d}")
+        write(os.path.join(deep, 'node.txt'), make_text(rng, 256))
+        write(os.path.join(deep, 'node.dat'), make_binary(rng, 256))
+
+
+def tree_stats(root):
+    files = 0
+    total = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            files += 1
+            total += os.path.getsize(os.path.join(dirpath, name))
+    return files, total
+
+
+def read_proc_io():
+    try:
+        with open('/proc/self/io', 'r', encoding='utf-8') as f:
+            return {key: int(value) for key, value in (line.split(':') for line in f)}
+    except OSError:
+        return None
+
+
+def peak_rss_kb():
+    # ru_maxrss survives execve on Linux and would report the parent's peak, so
+    # prefer VmHWM, which is reset for the new process image.
+    try:
+        with open('/proc/self/status', 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def op_backup(workdir):
+    from backup_restore import BackupRestoreHandler
+    handler = BackupRestoreHandler(action='backup', files=[TREE_DIR], backup_path=os.path.join(workdir, 'backup.txt'),
+                                   include_subdirs=True)
+    handler.run()
+
+
+def op_restore(workdir):
+    from backup_restore import BackupRestoreHandler
+    backup_file = os.path.join(workdir, 'backup.txt')
+    restore_dir = os.path.join(workdir, 'restored')
+    shutil.rmtree(restore_dir, ignore_errors=True)
+    os.makedirs(restore_dir)
+    handler = BackupRestoreHandler(action='restore', backup_file=backup_file, restore_dir=restore_dir)
+    handler.run()
+
+
+def op_tree(workdir):
+    from tree_scanner import TreeScanner
+    scanner = TreeScanner(TREE_DIR)
+    scanner.run()
+
+
+def op_copy(workdir):
+    from file_processor import FileProcessor
+    destination = os.path.join(workdir, 'copied')
+    shutil.rmtree(destination, ignore_errors=True)
+    os.makedirs(destination)
+    FileProcessor('copy', [TREE_DIR], destination, None).run()
+
+
+def op_zip(workdir):
+    from file_processor import FileProcessor
+    FileProcessor('zip', [TREE_DIR], os.path.join(workdir, 'tree.zip'), None).run()
+
+
+def op_unzip(workdir):
+    from file_processor import FileProcessor
+    archive = os.path.join(workdir, 'tree.zip')
+    destination = os.path.join(workdir, 'unzipped')
+    shutil.rmtree(destination, ignore_errors=True)
+    os.makedirs(destination)
+    FileProcessor('unzip', [archive], destination, None).run()
+
+
+OPS = {
+    'backup': op_backup,
+    'restore': op_restore,
+    'tree': op_tree,
+    'copy': op_copy,
+    'zip': op_zip,
+    'unzip': op_unzip,
+}
+
+
+def measure(op, workdir, files, total_bytes):
+    # Runs inside a fresh child process so peak RSS and syscall counters belong
+    # to one operation. Every operation handles the whole tree, whose counts the
+    # parent passes in so that no extra walk is timed.
+    os.chdir(workdir)
+    if op in INPUTS:
+        producer, name = INPUTS[op]
+        if not os.path.exists(name):
+            raise FileNotFoundError(f"{op} needs {name} in {workdir}; run {producer} first")
+    if op == 'tree':
+        # The tree scan reads no file data.
+        total_bytes = 0
+    io_before = read_proc_io()
+    start = time.perf_counter()
+    OPS[op](workdir)
+    elapsed = time.perf_counter() - start
+    io_after = read_proc_io()
+
+    result = {
+        'op': op,
+        'files': files,
+        'bytes': total_bytes,
+        'seconds': elapsed,
+        'files_per_s': files / elapsed if elapsed else None,
+        'mb_per_s': total_bytes / (1024 * 1024) / elapsed if elapsed and total_bytes else None,
+        'peak_rss_kb': peak_rss_kb(),
+        'read_syscalls': None,
+        'write_syscalls': None,
+    }
+    # syscr/syscw count read- and write-family calls only; open, stat and
+    # getdents are not included.
+    if io_before and io_after:
+        result['read_syscalls'] = io_after['syscr'] - io_before['syscr']
+        result['write_syscalls'] = io_after['syscw'] - io_before['syscw']
+    return result
+
+
+def run_child(op, workdir, tree):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', op, '--workdir', workdir,
+                             '--tree-stats', str(tree['files']), str(tree['bytes'])],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def best_of(runs):
+    best = min(runs, key=lambda r: r['seconds'])
+    best = dict(best)
+    best['runs'] = [r['seconds'] for r in runs]
+    return best
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for op, current in results['operations'].items():
+        previous = baseline.get('operations', {}).get(op)
+        if not previous:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = previous.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if metric in HIGHER_IS_BETTER:
+                change = -change
+            if change > tolerance:
+                regressions.append(f"{op}.{metric}: {old:.2f} -> {new:.2f} ({change * 100:.1f}% worse)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput benchmarks for backup, restore, file tree and file processor paths.")
+    parser.add_argument('--ops', nargs='+', choices=OPERATIONS, default=OPERATIONS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--scale', type=float, default=1.0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workdir')
+    parser.add_argument('--output', help="Write JSON results to this file")
+    parser.add_argument('--baseline', help="Compare against a stored JSON result and exit 1 on regression")
+    parser.add_argument('--tolerance', type=float, default=0.10)
+    parser.add_argument('--child', choices=OPERATIONS, help=argparse.SUPPRESS)
+    parser.add_argument('--tree-stats', nargs=2, type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.workdir, *args.tree_stats)))
+        return 0
+
+    for index, op in enumerate(args.ops):
+        if op in INPUTS:
+            producer, name = INPUTS[op]
+            existing = args.workdir and os.path.exists(os.path.join(args.workdir, name))
+            if producer not in args.ops[:index] and not existing:
+                parser.error(f"{op} needs {name}: run {producer} before it, or pass a --workdir that has one")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='ptf-bench-')
+    try:
+        tree_root = os.path.join(workdir, TREE_DIR)
+        if not os.path.isdir(tree_root):
+            make_tree(tree_root, seed=args.seed, scale=args.scale)
+        files, total_bytes = tree_stats(tree_root)
+
+        results = {
+            'seed': args.seed,
+            'scale': args.scale,
+            'tree': {'files': files, 'bytes': total_bytes},
+            'python': sys.version.split()[0],
+            'platform': sys.platform,
+            'operations': {},
+        }
+        for op in args.ops:
+            results['operations'][op] = best_of([run_child(op, workdir, results['tree']) for _ in range(args.repeat)])
+            summary = results['operations'][op]
+            mb_per_s = f"{summary['mb_per_s']:.1f} MB/s" if summary['mb_per_s'] else "-"
+            print(f"{op:8s} {summary['seconds']:8.3f}s {summary['files_per_s']:10.0f} files/s {mb_per_s:>12s} "
+                  f"peak {summary['peak_rss_kb']} KB", file=sys.stderr)
+
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=4)
+        else:
+            print(json.dumps(results, indent=4))
+
+        if args.baseline:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+            regressions = compare(results, baseline, args.tolerance)
+            for regression in regressions:
+                print(f"REGRESSION {regression}", file=sys.stderr)
+            if regressions:
+                return 1
+        return 0
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,395 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from cryptography.fernet import InvalidToken
+
+ENTRY_MARK = '---'
+RECORD_MARK = '==='
+MANIFEST_RECORD = 'manifest'
+MANIFEST_OFFSET_RECORD = 'manifest-offset'
+OFFSET_WIDTH = 20
+CHUNK_SIZE = 1024 * 1024
+
+# Unencrypted layout:
+#   Backup created on <timestamp>\n\n
+#   --- "<path>" [<size>] ---\n<size bytes of file data>\n
+#   === "<record>" [<size>] ===\n<size bytes of JSON>\n
+# The manifest record is followed by a fixed-size "manifest-offset" record
+# whose payload is the manifest's offset as OFFSET_WIDTH digits, so the
+# manifest is found from the end of the file without reading the entries.
+# Names are JSON strings, so newlines and other control characters in a path
+# cannot break the framing.
+# Encrypted backups store the preamble and every frame (header + payload) as
+# one Fernet token per line; the manifest is the last line.
+#
+# Legacy layout (no sizes and no manifest), still readable:
+#   Backup created on <timestamp>\n\n
+#   --- <path> ---\n<file data, with no terminator>
+# Encrypted legacy backups are the preamble, headers and file data as Fernet
+# tokens written back to back, with no newlines at all.
+
+
+def checksum(data):
+    return hashlib.blake2b(data).hexdigest()
+
+
+def frame_header(mark, name, size):
+    return f"{mark} {json.dumps(name)} [{size}] {mark}\n".encode('utf-8')
+
+
+def trailer_size():
+    return len(frame_header(RECORD_MARK, MANIFEST_OFFSET_RECORD, OFFSET_WIDTH)) + OFFSET_WIDTH + 1
+
+
+def parse_header(line):
+    try:
+        text = line.decode('utf-8').rstrip('\n')
+    except UnicodeDecodeError:
+        return None
+    mark = text[:3]
+    if mark not in (ENTRY_MARK, RECORD_MARK) or not text.startswith(mark + ' ') or not text.endswith(' ' + mark):
+        return None
+    name, sep, size = text[4:-4].rpartition(' [')
+    if not sep or not size.endswith(']') or not size[:-1].isdigit():
+        return None
+    try:
+        name = json.loads(name)
+    except ValueError:
+        return None
+    if not isinstance(name, str):
+        return None
+    return mark, name, int(size[:-1])
+
+
+def parse_legacy_header(line):
+    try:
+        text = line.decode('utf-8').rstrip('\r\n')
+    except UnicodeDecodeError:
+        return None
+    if len(text) < 9 or not text.startswith('--- ') or not text.endswith(' ---'):
+        return None
+    return text[4:-4]
+
+
+class ArchiveWriter:
+    def __init__(self, f, fernet=None):
+        self.f = f
+        self.fernet = fernet
+
+    def write_preamble(self, text):
+        data = f"{text}\n\n".encode('utf-8')
+        if self.fernet:
+            self.f.write(self.fernet.encrypt(data) + b'\n')
+        else:
+            self.f.write(data)
+
+    def frame(self, name, data, mark=ENTRY_MARK):
+        header = frame_header(mark, name, len(data))
+        if self.fernet:
+            return [self.fernet.encrypt(header + data) + b'\n']
+        return [header, data, b'\n']
+
+    def write(self, parts):
+        for part in parts:
+            self.f.write(part)
+
+    def write_entry(self, name, data, mark=ENTRY_MARK):
+        self.write(self.frame(name, data, mark))
+
+    def begin_entry(self, name, size):
+        self.f.write(frame_header(ENTRY_MARK, name, size))
+
+    def end_entry(self):
+        self.f.write(b'\n')
+
+    def write_record(self, name, obj):
+        self.write_entry(name, json.dumps(obj).encode('utf-8'), mark=RECORD_MARK)
+
+    def write_manifest(self, manifest):
+        offset = self.f.tell()
+        self.write_record(MANIFEST_RECORD, manifest)
+        if not self.fernet:
+            self.write_entry(MANIFEST_OFFSET_RECORD, f"{offset:0{OFFSET_WIDTH}d}".encode('ascii'), mark=RECORD_MARK)
+
+
+class ArchiveReader:
+    def __init__(self, f, fernet=None):
+        self.f = f
+        self.fernet = fernet
+        self.preamble = None
+        self.next_offset = None
+        self._view = memoryview(bytearray(CHUNK_SIZE))
+
+    def _read_preamble(self):
+        if self.fernet:
+            self.preamble = self.fernet.decrypt(self.f.readline().strip()).decode('utf-8').strip()
+            return
+        lines = []
+        while True:
+            line = self.f.readline()
+            if not line or not line.strip():
+                break
+            lines.append(line.decode('utf-8', errors='replace'))
+        self.preamble = ''.join(lines).strip()
+
+    def is_legacy(self):
+        # Checks the start of the file; the position is restored afterwards.
+        position = self.f.tell()
+        try:
+            self.f.seek(0)
+            first = self.f.readline()
+            if self.fernet:
+                return bool(first) and not first.endswith(b'\n')
+            line = first
+            while line and line.strip():
+                line = self.f.readline()
+            line = self.f.readline()
+            return parse_header(line) is None and parse_legacy_header(line) is not None
+        finally:
+            self.f.seek(position)
+
+    def frames(self, select=None, start_offset=None):
+        # Yields (mark, name, size, payload); unencrypted payloads larger than
+        # CHUNK_SIZE are yielded as an iterator of memoryview chunks over one
+        # reused buffer, so each chunk is only valid until the next is read.
+        # Frames for which select(mark, name, size) is false are skipped
+        # without reading their payload where the format allows it. While a
+        # frame is being consumed, next_offset is where the following frame
+        # starts, so a later run can resume there via start_offset.
+        if self.is_legacy():
+            if self.fernet:
+                yield from self._legacy_token_frames(select)
+                return
+            if start_offset is None:
+                self._read_preamble()
+            else:
+                self.f.seek(start_offset)
+            yield from self._legacy_frames(select)
+            return
+        if start_offset is None:
+            self._read_preamble()
+        else:
+            self.f.seek(start_offset)
+        if self.fernet:
+            while True:
+                line = self.f.readline()
+                if not line:
+                    return
+                self.next_offset = self.f.tell()
+                line = line.strip()
+                if not line:
+                    continue
+                frame = self.fernet.decrypt(line)
+                header, _, payload = frame.partition(b'\n')
+                parsed = self._parse(header + b'\n')
+                if select is None or select(*parsed):
+                    yield parsed + (payload,)
+            return
+        while True:
+            line = self.f.readline()
+            if not line:
+                return
+            mark, name, size = self._parse(line)
+            self.next_offset = self.f.tell() + size + 1
+            if select is not None and not select(mark, name, size):
+                self.f.seek(size, os.SEEK_CUR)
+            elif size > CHUNK_SIZE:
+                chunks = self._chunks(size)
+                yield mark, name, size, chunks
+                for _ in chunks:
+                    pass
+            else:
+                yield mark, name, size, self._read_exact(size)
+            if self.f.read(1) != b'\n':
+                raise ValueError(f"Corrupt backup: missing terminator after {name}")
+
+    def read_manifest(self):
+        # The manifest is the last frame; the file position is rewound afterwards.
+        manifest = None
+        try:
+            if self.is_legacy():
+                return None
+            if self.fernet:
+                last = _read_last_line(self.f)
+                if last:
+                    header, _, payload = self.fernet.decrypt(last).partition(b'\n')
+                    if parse_header(header + b'\n') == (RECORD_MARK, MANIFEST_RECORD, len(payload)):
+                        manifest = json.loads(payload)
+            else:
+                offset = self._manifest_offset()
+                if offset is not None:
+                    for mark, name, _, payload in self.frames(start_offset=offset):
+                        if (mark, name) == (RECORD_MARK, MANIFEST_RECORD):
+                            manifest = json.loads(read_payload(payload))
+                        break
+        finally:
+            self.f.seek(0)
+        return manifest
+
+    def _manifest_offset(self):
+        size = trailer_size()
+        if self.f.seek(0, os.SEEK_END) < size:
+            return None
+        self.f.seek(-size, os.SEEK_END)
+        header, _, payload = self.f.read(size).partition(b'\n')
+        if parse_header(header + b'\n') != (RECORD_MARK, MANIFEST_OFFSET_RECORD, OFFSET_WIDTH):
+            return None
+        if len(payload) != OFFSET_WIDTH + 1 or not payload.endswith(b'\n') or not payload[:-1].isdigit():
+            return None
+        return int(payload[:-1])
+
+    def _legacy_frames(self, select):
+        # An entry runs until the next header. A content line that is exactly
+        # a header is ambiguous and is read as one, as the old restore did.
+        name, content, roots = None, [], set()
+        while True:
+            position = self.f.tell()
+            line = self.f.readline()
+            start, header = _find_legacy_header(line, roots)
+            if line and header is None:
+                if line.startswith(b'Error reading file '):
+                    logging.warning(f"Backup recorded: {line.decode('utf-8', errors='replace').strip()}")
+                    start, header = 0, None
+                elif name is not None:
+                    content.append(line)
+                    continue
+                else:
+                    continue
+            if name is not None:
+                content.append(line[:start] if line else b'')
+                data = b''.join(content)
+                self.next_offset = position + start if line else position
+                if select is None or select(ENTRY_MARK, name, len(data)):
+                    yield ENTRY_MARK, name, len(data), data
+            if not line:
+                return
+            name, content = header, []
+            if name is not None:
+                roots.add(_path_root(name))
+
+    def _legacy_token_frames(self, select):
+        # Offsets into a run of back-to-back tokens are not resumable.
+        self.next_offset = None
+        tokens = _legacy_tokens(self.f, self.fernet)
+        self.preamble = next(tokens, b'').decode('utf-8', errors='replace').strip()
+        for token in tokens:
+            name = parse_legacy_header(token)
+            if name is None:
+                logging.warning(f"Backup recorded: {token.decode('utf-8', errors='replace').strip()}")
+                continue
+            data = next(tokens, None)
+            if data is None:
+                raise ValueError(f"Corrupt backup: no data after the header for {name}")
+            if select is None or select(ENTRY_MARK, name, len(data)):
+                yield ENTRY_MARK, name, len(data), data
+
+    def _parse(self, line):
+        parsed = parse_header(line)
+        if parsed is None:
+            raise ValueError(f"Corrupt or unsupported backup entry header: {line[:200]!r}")
+        return parsed
+
+    def _read_exact(self, size):
+        data = self.f.read(size)
+        if len(data) != size:
+            raise ValueError("Corrupt backup: truncated entry")
+        return data
+
+    def _chunks(self, size):
+        remaining = size
+        while remaining:
+            n = self.f.readinto(self._view[:min(CHUNK_SIZE, remaining)])
+            if not n:
+                raise ValueError("Corrupt backup: truncated entry")
+            remaining -= n
+            yield self._view[:n]
+
+
+def _path_root(name):
+    # The top-level folder of a path; '' for a bare file name.
+    name = name.replace('\\', '/')
+    prefix = '/' if name.startswith('/') else ''
+    folder, sep, _ = name[len(prefix):].partition('/')
+    return prefix + folder if sep else prefix
+
+
+def _find_legacy_header(line, roots):
+    # Legacy file data was written without a terminator, so a header can also
+    # follow the last line of a file directly. Such a mid-line header is only
+    # taken when its path shares the root of the headers seen so far; comment
+    # banners like "# --- helpers ---" stay part of the file.
+    header = parse_legacy_header(line)
+    if header is not None:
+        return 0, header
+    start = line.find(b'--- ', 1)
+    while start != -1:
+        header = parse_legacy_header(line[start:])
+        if header is not None and _path_root(header) in roots:
+            return start, header
+        start = line.find(b'--- ', start + 1)
+    return -1, None
+
+
+def _legacy_tokens(f, fernet):
+    # Every token starts with the version byte and a 64-bit timestamp, which
+    # encode as "gAAAAA" until 2106. The same text inside a token only causes
+    # a split that fails to decrypt and is joined to the next piece.
+    f.seek(0)
+    token = b''
+    for piece in re.split(rb'(?=gAAAAA)', f.read().strip()):
+        token += piece
+        if not token:
+            continue
+        try:
+            data = fernet.decrypt(token)
+        except InvalidToken:
+            continue
+        token = b''
+        yield data
+    if token:
+        raise ValueError("Corrupt or unsupported legacy backup: trailing data does not decrypt")
+
+
+def _read_last_line(f):
+    f.seek(0, os.SEEK_END)
+    pos = f.tell()
+    blocks = []
+    while pos > 0:
+        step = min(CHUNK_SIZE, pos)
+        pos -= step
+        f.seek(pos)
+        blocks.insert(0, f.read(step))
+        data = b''.join(blocks).rstrip(b'\n')
+        newline = data.rfind(b'\n')
+        if newline != -1:
+            return data[newline + 1:]
+    return b''.join(blocks).strip()
+
+
+def file_checksum(path):
+    hasher = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def payload_checksum(payload):
+    if isinstance(payload, bytes):
+        return checksum(payload)
+    hasher = hashlib.blake2b()
+    for chunk in payload:
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def read_payload(payload):
+    if isinstance(payload, bytes):
+        return payload
+    # Chunks are views of one reused buffer, so each is copied before the next is read.
+    data = bytearray()
+    for chunk in payload:
+        data += chunk
+    return bytes(data)
@@ -1,11 +1,41 @@
 import os
+import hashlib
+import json
 import logging
+import shutil
+import time
 import zipfile
+import zlib
+from collections import deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from cryptography.fernet import Fernet
 from PyQt5.QtCore import QThread, pyqtSignal
+from archive import ArchiveReader, ArchiveWriter, CHUNK_SIZE, RECORD_MARK, checksum, file_checksum, payload_checksum
+from change_journal import ChangeJournal, journal_job
+from checkpoint import (CHECKPOINT_INTERVAL, CheckpointLog, backup_checkpoint_path, fsync_path,
+                        restore_checkpoint_path, tail_checksum)
+from metrics import JobMetrics, JobProfiler
+from path_filter import PathFilter, walk
+from sparse import (EXTENTS_ALGORITHM, data_extents, extents_checksum, extents_hasher, file_extents_checksum, is_sparse,
+                    write_extents)
 from utils import format_size
 
+HASH_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+# Caps how many file buffers may be waiting for a hashing thread at once.
+MAX_PENDING_HASHES = 64
+# Chunks smaller than this are hashed inline; handing them to the pool costs more than it saves.
+INLINE_HASH_SIZE = 64 * 1024
+# Read-ahead: reader threads prefetch, hash and frame upcoming small files while
+# the backup thread writes earlier ones in order. Larger files are streamed by
+# the writer itself.
+READ_AHEAD_WORKERS = 8
+READ_AHEAD_FILES = 256
+READ_AHEAD_BYTES = 64 * 1024 * 1024
+PREFETCH_FILE_LIMIT = 1024 * 1024
+
+Prefetched = namedtuple('Prefetched', ['stat', 'size', 'frame', 'digest', 'error', 'seconds'])
+
 class BackupRestoreHandler(QThread):
     progress_updated = pyqtSignal(int)
     file_processed = pyqtSignal(str)
@@ -13,8 +43,11 @@ class BackupRestoreHandler(QThread):
     backup_failed = pyqtSignal(str)
     restore_completed = pyqtSignal()
     restore_failed = pyqtSignal(str)
+    verify_completed = pyqtSignal(int, int)
+    verify_failed = pyqtSignal(str)
+    job_summary = pyqtSignal(dict)
 
-    def __init__(self, action, files=None, backup_path=None, restore_dir=None, compress=False, include_subdirs=False, backup_file=None, encryption_key=None):
+    def __init__(self, action, files=None, backup_path=None, restore_dir=None, compress=False, include_subdirs=False, backup_file=None, encryption_key=None, profile=False, verify_source=False, skip_identical=False, compare_checksums=False, path_filter=None, journal_path=None):
         super().__init__()
         self.action = action
         self.files = files
@@ -24,145 +57,723 @@ class BackupRestoreHandler(QThread):
         self.include_subdirs = include_subdirs
         self.backup_file = backup_file
         self.encryption_key = encryption_key
+        self.profile = profile
+        self.verify_source = verify_source
+        self.skip_identical = skip_identical
+        self.compare_checksums = compare_checksums
+        self.path_filter = path_filter
+        self.journal_path = journal_path
+        self.metrics = None
         logging.basicConfig(level=logging.INFO, filename='backup_restore.log', format='%(asctime)s - %(levelname)s - %(message)s')
 
     def run(self):
+        self.metrics = JobMetrics(self.action)
+        try:
+            if self.profile:
+                with JobProfiler(self.metrics):
+                    self._run_action()
+            else:
+                self._run_action()
+        finally:
+            self.metrics.finish()
+            self.metrics.write_json()
+            summary = self.metrics.summary()
+            logging.info(f"Job summary: {json.dumps({k: v for k, v in summary.items() if k != 'profile'})}")
+            self.job_summary.emit(summary)
+
+    def _run_action(self):
         if self.action == 'backup':
             self._backup()
         elif self.action == 'restore':
             self._restore()
+        elif self.action == 'verify':
+            self._verify()
+        elif self.action == 'resume_backup':
+            self._backup(resume=True)
+        elif self.action == 'resume_restore':
+            self._restore(resume=True)
 
-    def _backup(self):
+    def _backup(self, resume=False):
         try:
-            if self.encryption_key:
-                with open(self.backup_path, 'wb') as f:
-                    self._write_backup(f, encrypted=True)
+            self._checkpoints = CheckpointLog(backup_checkpoint_path(self.backup_path))
+            if resume:
+                self._resume_backup()
             else:
-                with open(self.backup_path, 'w', encoding='utf-8') as f:
-                    self._write_backup(f, encrypted=False)
+                with open(self.backup_path, 'w+b') as f:
+                    self._write_backup(f, encrypted=bool(self.encryption_key))
+            self._checkpoints.remove()
+            self._save_journal_baseline()
             logging.info(f"Backup completed successfully at {self.backup_path}")
             self.backup_completed.emit(self.backup_path)
         except Exception as e:
+            self.metrics.count('errors')
             logging.error(f"Backup failed: {e}", exc_info=True)
             self.backup_failed.emit(str(e))
 
-    def _write_backup(self, f, encrypted):
-        timestamp = datetime.now().isoformat()
-        total_size = self.get_total_size()
+    def _write_backup(self, f, encrypted, resume_manifest=None):
+        # Failures propagate so the checkpoint log is kept for a later resume.
+        if resume_manifest is None:
+            timestamp = datetime.now().isoformat()
+            self._manifest = {'version': 1, 'algorithm': 'blake2b', 'created': timestamp, 'files': {}, 'errors': {}, 'links': {}}
+        else:
+            timestamp = resume_manifest['created']
+            self._manifest = resume_manifest
+        with self.metrics.phase('scan'):
+            entries, links = self._split_hardlinks(self._scan_work_list() if resume_manifest is None else self._scan_files())
+            done = self._manifest['files'].keys() | self._manifest['errors'].keys()
+            entries = [entry for entry in entries if entry[0] not in done]
+        total_size = sum(size for _, size in entries)
         processed_size = 0
 
-        try:
-            if encrypted:
-                fernet = Fernet(self.encryption_key)
-                f.write(fernet.encrypt(f"Backup created on {timestamp}\n\n".encode('utf-8')))
-            else:
-                f.write(f"Backup created on {timestamp}\n\n")
-
-            for item in self.files:
-                if os.path.isdir(item):
-                    for root, _, files in os.walk(item):
-                        if not self.include_subdirs and root != item:
-                            continue
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            self._write_file(f, file_path, encrypted)
-                            file_size = os.path.getsize(file_path)
-                            processed_size += file_size
-                            self.progress_updated.emit(int(processed_size / total_size * 100))
-                            self.file_processed.emit(f"{file_path} ({format_size(file_size)})")
-                elif os.path.isfile(item):
-                    self._write_file(f, item, encrypted)
-                    file_size = os.path.getsize(item)
-                    processed_size += file_size
+        writer = ArchiveWriter(f, Fernet(self.encryption_key) if encrypted else None)
+        self._unsaved = {'files': {}, 'errors': {}}
+        if resume_manifest is None:
+            writer.write_preamble(f"Backup created on {timestamp}")
+            self._checkpoints.start({'type': 'backup', 'created': timestamp, 'files': self.files,
+                                     'include_subdirs': self.include_subdirs, 'encrypted': encrypted,
+                                     'path_filter': self.path_filter.to_dict() if self.path_filter else None})
+            self._write_backup_checkpoint(f, None)
+        self._last_checkpoint = time.monotonic()
+
+        self._view = memoryview(bytearray(CHUNK_SIZE))
+        with ThreadPoolExecutor(max_workers=HASH_WORKERS) as hash_pool, \
+                ThreadPoolExecutor(max_workers=READ_AHEAD_WORKERS) as read_pool:
+            self._hash_pool = hash_pool
+            pending = deque()
+            pending_bytes = 0
+            next_index = 0
+            while pending or next_index < len(entries):
+                while next_index < len(entries) and len(pending) < READ_AHEAD_FILES:
+                    file_path, file_size = entries[next_index]
+                    prefetch = file_size <= PREFETCH_FILE_LIMIT
+                    if prefetch and pending and pending_bytes + file_size > READ_AHEAD_BYTES:
+                        break
+                    future = read_pool.submit(self._prefetch, writer, file_path) if prefetch else None
+                    pending.append((file_path, file_size, future))
+                    pending_bytes += file_size if prefetch else 0
+                    next_index += 1
+
+                file_path, file_size, future = pending.popleft()
+                start = time.perf_counter()
+                if future is None:
+                    self._write_file(writer, file_path)
+                    seconds = time.perf_counter() - start
+                else:
+                    pending_bytes -= file_size
+                    with self.metrics.phase('wait'):
+                        prefetched = future.result()
+                    self._write_prefetched(writer, file_path, prefetched)
+                    seconds = prefetched.seconds + time.perf_counter() - start
+                self.metrics.record_file(seconds, file_size)
+                processed_size += file_size
+                if total_size:
                     self.progress_updated.emit(int(processed_size / total_size * 100))
-                    self.file_processed.emit(f"{item} ({format_size(file_size)})")
-        except Exception as e:
-            logging.error(f"Error during backup: {e}", exc_info=True)
+                self.file_processed.emit(f"{file_path} ({format_size(file_size)})")
+                if time.monotonic() - self._last_checkpoint >= CHECKPOINT_INTERVAL:
+                    self._write_backup_checkpoint(f, file_path)
+
+        for link_path, target_path in links.items():
+            if target_path in self._manifest['files']:
+                self._manifest['links'][link_path] = target_path
+                self.metrics.count('hardlinks')
+                self.file_processed.emit(f"{link_path} (hard link to {target_path})")
+            else:
+                self._record_read_error(link_path, self._manifest['errors'].get(target_path, "hard link target was not backed up"))
+        writer.write_manifest(self._manifest)
+
+        with self.metrics.phase('fsync'):
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _write_backup_checkpoint(self, f, last_path):
+        with self.metrics.phase('fsync'):
+            f.flush()
+            os.fsync(f.fileno())
+        offset = f.tell()
+        self._checkpoints.append({'offset': offset, 'tail_blake2b': tail_checksum(f, offset), 'last_path': last_path,
+                                  'files': self._unsaved['files'], 'errors': self._unsaved['errors']})
+        self._unsaved = {'files': {}, 'errors': {}}
+        self._last_checkpoint = time.monotonic()
+
+    def _resume_backup(self):
+        job, records = self._checkpoints.load()
+        encrypted = job['encrypted']
+        if encrypted and not self.encryption_key:
+            raise ValueError("This backup is encrypted; enter its encryption key to resume it")
+        self.files = job['files']
+        self.include_subdirs = job['include_subdirs']
+        self.path_filter = PathFilter.from_dict(job['path_filter']) if job.get('path_filter') else None
+
+        with open(self.backup_path, 'r+b') as f:
+            if encrypted:
+                # Fails with InvalidToken before anything is appended under a different key.
+                Fernet(self.encryption_key).decrypt(f.readline().strip())
+            valid = self._last_valid_checkpoint(f, records)
+            if valid is None:
+                raise ValueError(f"No checkpoint matches the partial backup {self.backup_path}; start a new backup instead")
+            records = records[:valid + 1]
+            self._checkpoints.rewrite(job, records)
+
+            manifest = {'version': 1, 'algorithm': 'blake2b', 'created': job['created'], 'files': {}, 'errors': {}, 'links': {}}
+            for record in records:
+                manifest['files'].update(record['files'])
+                manifest['errors'].update(record['errors'])
+            offset = records[-1]['offset']
+            f.truncate(offset)
+            f.seek(offset)
+            logging.info(f"Resuming backup {self.backup_path} at offset {offset} after {len(manifest['files'])} files")
+            self._write_backup(f, encrypted, resume_manifest=manifest)
 
-    def _write_file(self, f, file_path, encrypted):
-        header = f"--- {file_path} ---\n".encode('utf-8')
+    def _last_valid_checkpoint(self, f, records):
+        size = os.fstat(f.fileno()).st_size
+        for index in range(len(records) - 1, -1, -1):
+            record = records[index]
+            if record['offset'] <= size and tail_checksum(f, record['offset']) == record['tail_blake2b']:
+                return index
+        return None
+
+    def _add_to_manifest(self, file_path, info):
+        self._manifest['files'][file_path] = info
+        self._unsaved['files'][file_path] = info
+
+    def _prefetch(self, writer, file_path):
+        # Runs on a read-ahead thread; phase times here overlap with the writer's.
+        start = time.perf_counter()
         try:
             with open(file_path, 'rb') as file:
+                stat = os.fstat(file.fileno())
+                if stat.st_size > PREFETCH_FILE_LIMIT:
+                    return Prefetched(stat, None, None, None, None, 0.0)
                 content = file.read()
-                if encrypted:
-                    fernet = Fernet(self.encryption_key)
-                    f.write(fernet.encrypt(header))
-                    f.write(fernet.encrypt(content))
-                else:
-                    f.write(header.decode('utf-8'))
-                    f.write(content.decode('utf-8', errors='ignore'))
         except Exception as e:
-            error_msg = f"Error reading file {file_path}: {str(e)}\n".encode('utf-8')
-            logging.error(f"Error reading file {file_path}: {e}", exc_info=True)
-            if encrypted:
-                fernet = Fernet(self.encryption_key)
-                f.write(fernet.encrypt(error_msg))
+            return Prefetched(None, None, None, None, e, time.perf_counter() - start)
+        read_done = time.perf_counter()
+        self.metrics.add_phase_time('read', read_done - start)
+        digest = checksum(content)
+        frame = writer.frame(file_path, content)
+        self.metrics.add_phase_time('transform', time.perf_counter() - read_done)
+        return Prefetched(stat, len(content), frame, digest, None, time.perf_counter() - start)
+
+    def _write_prefetched(self, writer, file_path, prefetched):
+        if prefetched.error is not None:
+            self._record_read_error(file_path, prefetched.error)
+            return
+        if prefetched.frame is None:
+            # The file grew past the prefetch limit after it was scanned.
+            self._write_file(writer, file_path)
+            return
+        with self.metrics.phase('write'):
+            writer.write(prefetched.frame)
+        # The size is what was read, not what fstat saw, so it matches the stored data and checksum.
+        self._add_to_manifest(file_path, {'size': prefetched.size, 'mtime': prefetched.stat.st_mtime,
+                                          'blake2b': prefetched.digest})
+
+    def _write_file(self, writer, file_path):
+        try:
+            with self.metrics.phase('read'):
+                file = open(file_path, 'rb')
+        except Exception as e:
+            self._record_read_error(file_path, e)
+            return
+        with file:
+            stat = os.fstat(file.fileno())
+            if writer.fernet:
+                self._write_encrypted_file(writer, file_path, file, stat)
             else:
-                f.write(error_msg.decode('utf-8'))
+                self._write_raw_file(writer, file_path, file, stat)
 
-    def get_total_size(self):
-        total_size = 0
+    def _write_encrypted_file(self, writer, file_path, file, stat):
+        extents = self._sparse_extents(file, stat)
+        try:
+            with self.metrics.phase('read'):
+                if extents is None:
+                    content = file.read()
+                else:
+                    content = b''.join(self._read_extent(file, offset, length) for offset, length in extents)
+        except Exception as e:
+            self._record_read_error(file_path, e)
+            return
+        if extents is None:
+            hashing = self._hash_pool.submit(checksum, content)
+        else:
+            hashing = self._hash_pool.submit(extents_checksum, [content], extents, stat.st_size)
+        with self.metrics.phase('transform'):
+            frame = writer.frame(file_path, content)
+        with self.metrics.phase('write'):
+            writer.write(frame)
+        info = {'size': len(content), 'mtime': stat.st_mtime, 'blake2b': hashing.result()}
+        if extents is not None:
+            info.update(size=stat.st_size, extents=extents, algorithm=EXTENTS_ALGORITHM)
+        self._add_to_manifest(file_path, info)
+
+    def _read_extent(self, file, offset, length):
+        file.seek(offset)
+        data = file.read(length)
+        # Zero-pad if the file shrank, like the unencrypted path does.
+        return data + bytes(length - len(data))
+
+    def _write_raw_file(self, writer, file_path, file, stat):
+        # Streams the file through one reused buffer. Hashing a large chunk on the
+        # pool overlaps with writing it, and the size in the header comes from fstat.
+        # For sparse files only the data extents are read, stored and hashed.
+        view = self._view
+        extents = self._sparse_extents(file, stat)
+        if extents is None:
+            hasher = hashlib.blake2b()
+            regions = [[0, stat.st_size]]
+        else:
+            hasher = extents_hasher(extents, stat.st_size)
+            regions = extents
+        with self.metrics.phase('write'):
+            writer.begin_entry(file_path, sum(length for _, length in regions))
+        position = 0
+        for offset, remaining in regions:
+            if offset != position:
+                file.seek(offset)
+            position = offset + remaining
+            while remaining:
+                error = None
+                with self.metrics.phase('read'):
+                    try:
+                        n = file.readinto(view[:min(len(view), remaining)])
+                    except OSError as e:
+                        error, n = e, 0
+                if not n:
+                    # The file shrank or became unreadable after its header was written;
+                    # pad with zeros so the archive stays well-formed.
+                    self._record_read_error(file_path, error or "file shrank during backup")
+                    n = min(len(view), remaining)
+                    view[:n] = bytes(n)
+                chunk = view[:n]
+                with self.metrics.phase('write'):
+                    if n < INLINE_HASH_SIZE:
+                        hasher.update(chunk)
+                        writer.write((chunk,))
+                    else:
+                        hashing = self._hash_pool.submit(hasher.update, chunk)
+                        writer.write((chunk,))
+                        hashing.result()
+                remaining -= n
+        writer.end_entry()
+        info = {'size': stat.st_size, 'mtime': stat.st_mtime, 'blake2b': hasher.hexdigest()}
+        if extents is not None:
+            info.update(extents=extents, algorithm=EXTENTS_ALGORITHM)
+        self._add_to_manifest(file_path, info)
+
+    def _sparse_extents(self, file, stat):
+        # Returns the data extents of a sparse file, or None to store it whole.
+        if not is_sparse(stat):
+            return None
+        with self.metrics.phase('scan'):
+            extents = data_extents(file, stat.st_size)
+        if extents is None or extents == [[0, stat.st_size]]:
+            return None
+        self.metrics.count('sparse_files')
+        return extents
+
+    def _record_read_error(self, file_path, error):
+        if file_path in self._manifest['errors']:
+            return
+        self.metrics.count('errors')
+        self._manifest['errors'][file_path] = str(error)
+        self._unsaved['errors'][file_path] = str(error)
+        logging.error(f"Error reading file {file_path}: {error}")
+        self.file_processed.emit(f"Error reading file {file_path}: {error}")
+
+    def _scan_files(self):
         for item in self.files:
             if os.path.isdir(item):
-                for root, _, files in os.walk(item):
-                    if not self.include_subdirs and root != item:
-                        continue
-                    total_size += sum(os.path.getsize(os.path.join(root, file)) for file in files)
+                for root, _, files in walk(item, self.path_filter, self.include_subdirs):
+                    for file in files:
+                        yield self._stat_entry(os.path.join(root, file))
             elif os.path.isfile(item):
-                total_size += os.path.getsize(item)
-        return total_size
+                yield self._stat_entry(item)
 
-    def _restore(self):
+    def _scan_work_list(self):
+        # With a change journal, the last backup's file list plus the changes
+        # since replace the full scan; otherwise the scan result becomes the
+        # baseline for the next run.
+        self._journal_baseline = None
+        if not self.journal_path:
+            return self._scan_files()
+        journal = ChangeJournal(self.journal_path)
+        job = journal_job(self.files, self.include_subdirs, self.path_filter)
+        work = journal.work_list(job)
+        if work is not None:
+            position, scanned = work
+            self.metrics.count('journal_runs')
+        else:
+            logging.info(f"Change journal {self.journal_path} is missing, stale or incomplete; scanning the full tree")
+            position = journal.position(job)
+            scanned = list(self._scan_files())
+        if position is not None:
+            self._journal_baseline = (journal, job, position, scanned)
+        return scanned
+
+    def _save_journal_baseline(self):
+        if not getattr(self, '_journal_baseline', None):
+            return
+        journal, job, position, scanned = self._journal_baseline
         try:
+            journal.write_baseline(job, position, scanned)
+        except Exception as e:
+            logging.error(f"Error saving change journal baseline for {self.backup_path}: {e}", exc_info=True)
+
+    def _stat_entry(self, file_path):
+        try:
+            return file_path, os.stat(file_path)
+        except OSError as e:
+            logging.error(f"Error getting file size for {file_path}: {e}", exc_info=True)
+            return file_path, None
+
+    def _split_hardlinks(self, scanned):
+        # A file with several hard links is stored once, under the first path
+        # seen; its other paths become entries in the manifest's links map.
+        entries, links, first_paths = [], {}, {}
+        for file_path, stat in scanned:
+            if stat is None:
+                entries.append((file_path, 0))
+                continue
+            if stat.st_nlink > 1:
+                key = (stat.st_dev, stat.st_ino)
+                first = first_paths.setdefault(key, file_path)
+                if first != file_path:
+                    links[file_path] = first
+                    continue
+            entries.append((file_path, stat.st_size))
+        return entries, links
+
+    def get_total_size(self):
+        return sum(stat.st_size for _, stat in self._scan_files() if stat is not None)
+
+    def _restore(self, resume=False):
+        try:
+            self._checkpoints = CheckpointLog(restore_checkpoint_path(self.restore_dir))
+            if resume:
+                resume_record = self._load_restore_checkpoint()
+            else:
+                resume_record = None
+                # The checkpoint log lives in the restore directory.
+                os.makedirs(self.restore_dir, exist_ok=True)
+                self._checkpoints.start({'type': 'restore', 'backup_file': os.path.abspath(self.backup_file),
+                                         'archive_size': os.path.getsize(self.backup_file),
+                                         'skip_identical': self.skip_identical, 'compare_checksums': self.compare_checksums})
+            self._last_checkpoint = time.monotonic()
+            self._unsynced_files = set()
+            self._unsynced_dirs = set()
             if self.backup_file.lower().endswith('.zip'):
-                self.restore_from_zip()
+                self.restore_from_zip(resume_record)
             else:
-                self.restore_uncompressed()
+                self.restore_uncompressed(resume_record)
+            self._checkpoints.remove()
+            logging.info(f"Restore completed from {self.backup_file}, {self.metrics.counters.get('skipped', 0)} unchanged files skipped")
             self.restore_completed.emit()
         except Exception as e:
+            self.metrics.count('errors')
             logging.error(f"Restore failed: {e}", exc_info=True)
             self.restore_failed.emit(str(e))
 
-    def restore_from_zip(self):
+    def _load_restore_checkpoint(self):
+        job, records = self._checkpoints.load()
+        self.backup_file = job['backup_file']
+        self.skip_identical = job['skip_identical']
+        self.compare_checksums = job['compare_checksums']
+        if os.path.getsize(self.backup_file) != job['archive_size']:
+            raise ValueError(f"{self.backup_file} has changed since the interrupted restore; start a new restore instead")
+        with open(self.backup_file, 'rb') as archive:
+            for record in reversed(records):
+                try:
+                    last_ok = record['last_path'] is None or os.path.getsize(record['last_path']) == record['last_size']
+                except OSError:
+                    last_ok = False
+                if last_ok and (record['offset'] is None or tail_checksum(archive, record['offset']) == record['tail_blake2b']):
+                    logging.info(f"Resuming restore from {self.backup_file} after {record['entries']} entries")
+                    return record
+        logging.warning(f"No usable checkpoint in {self._checkpoints.path}, restoring {self.backup_file} from the start")
+        return None
+
+    def _write_restore_checkpoint(self, entries, archive, offset, last_path, last_size):
+        # Only what was restored since the previous checkpoint is flushed: the
+        # files written and the directories whose entries changed.
+        with self.metrics.phase('fsync'):
+            for path in self._unsynced_files:
+                fsync_path(path)
+            if hasattr(os, 'O_DIRECTORY'):
+                for path in self._unsynced_dirs:
+                    fsync_path(path, os.O_RDONLY | os.O_DIRECTORY)
+        self._unsynced_files.clear()
+        self._unsynced_dirs.clear()
+        self._checkpoints.append({'entries': entries, 'offset': offset,
+                                  'tail_blake2b': tail_checksum(archive, offset) if offset is not None else None,
+                                  'last_path': last_path, 'last_size': last_size})
+        self._last_checkpoint = time.monotonic()
+
+    def restore_from_zip(self, resume_record=None):
         try:
             with zipfile.ZipFile(self.backup_file, 'r') as zf:
-                total_size = sum(info.file_size for info in zf.infolist())
+                infos = zf.infolist()
+                total_size = sum(info.file_size for info in infos)
                 processed_size = 0
-                for info in zf.infolist():
-                    zf.extract(info, self.restore_dir)
+                first = resume_record['entries'] if resume_record else 0
+                for index, info in enumerate(infos[first:], start=first):
+                    if time.monotonic() - self._last_checkpoint >= CHECKPOINT_INTERVAL and index > first:
+                        previous = infos[index - 1]
+                        last_path = None if previous.is_dir() else self._zip_restore_path(previous)
+                        self._write_restore_checkpoint(index, None, None, last_path, previous.file_size)
+                    start = time.perf_counter()
+                    restore_path = self._zip_restore_path(info)
                     processed_size += info.file_size
-                    self.progress_updated.emit(int(processed_size / total_size * 100))
-                    self.file_processed.emit(f"{os.path.join(self.restore_dir, info.filename)} ({format_size(info.file_size)})")
+                    if total_size:
+                        self.progress_updated.emit(int(processed_size / total_size * 100))
+                    mtime = time.mktime(info.date_time + (0, 0, -1))
+                    if not info.is_dir() and self.skip_identical and self._is_identical(
+                            restore_path, info.file_size, mtime, lambda: self._crc32(restore_path) == info.CRC, mtime_tolerance=2):
+                        self.file_processed.emit(f"Unchanged, skipped: {restore_path}")
+                        continue
+                    with self.metrics.phase('write'):
+                        self._make_restore_dirs(restore_path)
+                        restore_path = zf.extract(info, self.restore_dir)
+                        if not info.is_dir():
+                            os.utime(restore_path, (time.time(), mtime))
+                            self._unsynced_files.add(restore_path)
+                    self.metrics.record_file(time.perf_counter() - start, info.file_size)
+                    self.file_processed.emit(f"{restore_path} ({format_size(info.file_size)})")
         except Exception as e:
             logging.error(f"Failed to restore from zip: {e}", exc_info=True)
-            self.restore_failed.emit(f"Failed to restore from zip: {str(e)}")
+            raise
+
+    def _zip_restore_path(self, info):
+        # Where ZipFile.extract writes the member: absolute paths, drive
+        # letters and '..' components are stripped from its name.
+        name = info.filename.replace('/', os.path.sep)
+        if os.path.altsep:
+            name = name.replace(os.path.altsep, os.path.sep)
+        name = os.path.splitdrive(name)[1]
+        name = os.path.sep.join(part for part in name.split(os.path.sep) if part not in ('', os.path.curdir, os.path.pardir))
+        if os.path.sep == '\\':
+            name = zipfile.ZipFile._sanitize_windows_name(name, os.path.sep)
+        return os.path.normpath(os.path.join(self.restore_dir, name))
 
-    def restore_uncompressed(self):
+    def restore_uncompressed(self, resume_record=None):
         try:
-            if self.encryption_key:
-                with open(self.backup_file, 'rb') as f:
-                    content = f.read()
-                fernet = Fernet(self.encryption_key)
-                content = fernet.decrypt(content).decode('utf-8')
-            else:
-                with open(self.backup_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-            files = content.split('\n\n')
-            total_size = sum(len(file) for file in files)
-            processed_size = 0
-
-            for file in files:
-                if file.strip():
-                    header, data = file.split('\n', 1)
-                    file_path = header.strip("--- ").strip()
-                    restore_path = os.path.join(self.restore_dir, os.path.relpath(file_path))
-                    os.makedirs(os.path.dirname(restore_path), exist_ok=True)
-                    with open(restore_path, 'w', encoding='utf-8') as out_file:
-                        out_file.write(data)
-                    file_size = len(data)
-                    processed_size += file_size
-                    self.progress_updated.emit(int(processed_size / total_size * 100))
+            fernet = Fernet(self.encryption_key) if self.encryption_key else None
+            total_size = os.path.getsize(self.backup_file)
+
+            with open(self.backup_file, 'rb') as f:
+                reader = ArchiveReader(f, fernet)
+                with self.metrics.phase('scan'):
+                    manifest = reader.read_manifest()
+                manifest_files = manifest['files'] if manifest else {}
+                if self.skip_identical and not manifest:
+                    logging.warning(f"{self.backup_file} has no manifest, restoring every file")
+
+                def select(mark, file_path, file_size):
+                    info = manifest_files.get(file_path)
+                    if mark == RECORD_MARK or not self.skip_identical or info is None:
+                        return True
+                    restore_path = self._restore_path(file_path)
+                    if self._is_identical(restore_path, info['size'], info['mtime'],
+                                          lambda: self._matches_entry(restore_path, info)):
+                        self.file_processed.emit(f"Unchanged, skipped: {restore_path}")
+                        return False
+                    return True
+
+                entries = resume_record['entries'] if resume_record else 0
+                frames = reader.frames(select=select, start_offset=resume_record['offset'] if resume_record else None)
+                while True:
+                    start = time.perf_counter()
+                    with self.metrics.phase('read'):
+                        frame = next(frames, None)
+                    if frame is None:
+                        break
+                    mark, file_path, file_size, payload = frame
+                    if mark == RECORD_MARK:
+                        continue
+                    restore_path = self._restore_path(file_path)
+                    info = manifest_files.get(file_path)
+                    with self.metrics.phase('write'):
+                        self._make_restore_dirs(restore_path)
+                        with open(restore_path, 'wb') as out_file:
+                            if info is not None and info.get('extents') is not None:
+                                write_extents(out_file, [payload] if isinstance(payload, bytes) else payload,
+                                              info['extents'], info['size'])
+                            elif isinstance(payload, bytes):
+                                out_file.write(payload)
+                            else:
+                                for chunk in payload:
+                                    out_file.write(chunk)
+                        if info is not None:
+                            os.utime(restore_path, (time.time(), info['mtime']))
+                        self._unsynced_files.add(restore_path)
+                    self.metrics.record_file(time.perf_counter() - start, file_size)
+                    if total_size:
+                        self.progress_updated.emit(min(100, int(f.tell() / total_size * 100)))
                     self.file_processed.emit(f"{restore_path} ({format_size(file_size)})")
+                    entries += 1
+                    if time.monotonic() - self._last_checkpoint >= CHECKPOINT_INTERVAL:
+                        # A sparse entry stores only its extents but is restored at its full size.
+                        restored_size = info['size'] if info is not None and info.get('extents') is not None else file_size
+                        self._write_restore_checkpoint(entries, f, reader.next_offset, restore_path, restored_size)
+
+            for link_path, target_path in (manifest or {}).get('links', {}).items():
+                self._restore_link(link_path, target_path)
         except Exception as e:
             logging.error(f"Failed to restore uncompressed: {e}", exc_info=True)
-            self.restore_failed.emit(f"Failed to restore uncompressed: {str(e)}")
+            raise
+
+    def _make_restore_dirs(self, restore_path):
+        # Remembers the directories created for restore_path, and the ones
+        # that gain an entry, for the next checkpoint to fsync.
+        parent = os.path.dirname(restore_path)
+        directory = parent
+        while directory and not os.path.isdir(directory):
+            self._unsynced_dirs.add(directory)
+            directory = os.path.dirname(directory)
+        self._unsynced_dirs.add(directory or os.curdir)
+        self._unsynced_dirs.add(parent or os.curdir)
+        os.makedirs(parent, exist_ok=True)
+
+    def _restore_path(self, file_path):
+        return os.path.join(self.restore_dir, os.path.relpath(file_path))
+
+    def _restore_link(self, link_path, target_path):
+        restore_path = self._restore_path(link_path)
+        target = self._restore_path(target_path)
+        with self.metrics.phase('write'):
+            os.makedirs(os.path.dirname(restore_path), exist_ok=True)
+            if os.path.lexists(restore_path):
+                if os.path.samefile(restore_path, target):
+                    return
+                os.remove(restore_path)
+            try:
+                os.link(target, restore_path)
+            except OSError as e:
+                # Cross-device, or a filesystem without hard links.
+                logging.warning(f"Could not hard link {restore_path} to {target}, copying instead: {e}")
+                shutil.copy2(target, restore_path)
+        self.metrics.count('hardlinks')
+        self.file_processed.emit(f"{restore_path} (hard link to {target})")
+
+    def _is_identical(self, path, size, mtime, same_checksum, mtime_tolerance=0.001):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        identical = False
+        if stat.st_size == size:
+            if abs(stat.st_mtime - mtime) <= mtime_tolerance:
+                identical = True
+            elif self.compare_checksums:
+                with self.metrics.phase('hash'):
+                    identical = same_checksum()
+                if identical:
+                    os.utime(path, (stat.st_atime, mtime))
+        if identical:
+            self.metrics.count('skipped')
+        return identical
+
+    def _crc32(self, path):
+        crc = 0
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                crc = zlib.crc32(chunk, crc)
+        return crc
+
+    def _verify(self):
+        try:
+            checked, problems = self.verify_backup()
+            logging.info(f"Verified {self.backup_file}: {checked} files checked, {problems} problems")
+            self.verify_completed.emit(checked, problems)
+        except Exception as e:
+            self.metrics.count('errors')
+            logging.error(f"Verify failed: {e}", exc_info=True)
+            self.verify_failed.emit(str(e))
+
+    def verify_backup(self):
+        fernet = Fernet(self.encryption_key) if self.encryption_key else None
+        manifest = None
+        archived = {}
+        pending = deque()
+        total_size = os.path.getsize(self.backup_file)
+        processed_size = 0
+
+        with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+            with open(self.backup_file, 'rb') as f:
+                reader = ArchiveReader(f, fernet)
+                with self.metrics.phase('scan'):
+                    # Read up front so sparse entries can be hashed with their extent maps.
+                    manifest = reader.read_manifest()
+                manifest_files = manifest['files'] if manifest else {}
+                frames = reader.frames(select=lambda mark, name, size: mark != RECORD_MARK)
+                while True:
+                    start = time.perf_counter()
+                    with self.metrics.phase('read'):
+                        frame = next(frames, None)
+                    if frame is None:
+                        break
+                    mark, name, size, payload = frame
+                    processed_size += size
+                    info = manifest_files.get(name, {})
+                    if isinstance(payload, bytes):
+                        if len(pending) >= MAX_PENDING_HASHES:
+                            pending.popleft().result()
+                        if info.get('extents') is not None:
+                            archived[name] = pool.submit(extents_checksum, [payload], info['extents'], info['size'])
+                        else:
+                            archived[name] = pool.submit(checksum, payload)
+                        pending.append(archived[name])
+                    else:
+                        with self.metrics.phase('hash'):
+                            archived[name] = Future()
+                            if info.get('extents') is not None:
+                                archived[name].set_result(extents_checksum(payload, info['extents'], info['size']))
+                            else:
+                                archived[name].set_result(payload_checksum(payload))
+                    self.metrics.record_file(time.perf_counter() - start, size)
+                    if total_size:
+                        self.progress_updated.emit(min(100, int(processed_size / total_size * 100)))
+
+            if manifest is None:
+                raise ValueError("Backup has no checksum manifest")
+
+            problems = []
+            for name, info in manifest['files'].items():
+                if name not in archived:
+                    problems.append(f"Missing from archive: {name}")
+                elif archived[name].result() != info['blake2b']:
+                    problems.append(f"Checksum mismatch in archive: {name}")
+            for name in archived:
+                if name not in manifest['files']:
+                    problems.append(f"Not in manifest: {name}")
+            for name, error in manifest.get('errors', {}).items():
+                problems.append(f"Not backed up ({error}): {name}")
+            for name, target in manifest.get('links', {}).items():
+                if target not in manifest['files']:
+                    problems.append(f"Hard link target missing from archive: {name} -> {target}")
+
+            if self.verify_source:
+                names = list(manifest['files'])
+                with self.metrics.phase('verify_source'):
+                    for name, result in zip(names, pool.map(self._source_matches, names, manifest['files'].values())):
+                        if result is None:
+                            problems.append(f"Source missing or unreadable: {name}")
+                        elif not result:
+                            problems.append(f"Source differs from backup: {name}")
+
+        for problem in problems:
+            self.file_processed.emit(problem)
+        self.metrics.count('errors', len(problems))
+        return len(archived), len(problems)
+
+    def _source_matches(self, path, info):
+        try:
+            return self._matches_entry(path, info)
+        except OSError:
+            return None
+
+    def _matches_entry(self, path, info):
+        # Sparse entries are compared through their extents, so the holes are
+        # neither read nor hashed.
+        if info.get('algorithm') == EXTENTS_ALGORITHM:
+            return file_extents_checksum(path, info['extents'], info['size']) == info['blake2b']
+        return file_checksum(path) == info['blake2b']
@@ -0,0 +1,467 @@
+import ctypes
+import ctypes.util
+import errno
+import json
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import datetime
+from path_filter import GITIGNORE_FILE
+
+JOURNAL_SUFFIX = '.journal'
+BASELINE_SUFFIX = '.base'
+FLUSH_INTERVAL = 1.0
+# A journal whose watcher has not touched it for this long is assumed dead.
+STALE_AFTER = 60.0
+MAX_PENDING = 100000
+
+# The journal is a JSON-lines file. The first line describes the watched
+# selection and carries an id that changes whenever the watcher (re)starts.
+# Each later line is [CHANGED, path] or [DELETED, path], coalesced per flush;
+# a deleted directory covers everything below it. A final [OVERFLOWED] or
+# [STOPPED] line means events may have been missed from then on. Next to it,
+# <journal>.base holds the file list of the last backup and the journal
+# offset it corresponds to. Once a backup has moved the baseline on, the
+# watcher compacts the journal: the events before the baseline offset are
+# dropped, and the new header gets a new id plus 'continues' and
+# 'continues_at', the old id and offset it picks up from, so a baseline taken
+# from the old journal at or after that offset still applies.
+CHANGED, DELETED, OVERFLOWED, STOPPED = 'c', 'd', 'o', 's'
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, 'O_CLOEXEC', 0o2000000)
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+              IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct('iIII')
+
+FileStat = namedtuple('FileStat', ['st_size', 'st_dev', 'st_ino', 'st_nlink'])
+
+
+def journal_path_for(backup_path):
+    return backup_path + JOURNAL_SUFFIX
+
+
+def journal_job(files, include_subdirs, path_filter):
+    return {'files': list(files), 'include_subdirs': include_subdirs,
+            'path_filter': path_filter.to_dict() if path_filter else None}
+
+
+def _load_libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+def inotify_available():
+    return _load_libc() is not None
+
+
+def _complete_size(f):
+    # Size of f up to the end of its last complete line.
+    size = f.seek(0, os.SEEK_END)
+    f.seek(max(0, size - 65536))
+    tail = f.read()
+    return size - (len(tail) - tail.rfind(b'\n') - 1)
+
+
+class ChangeJournal:
+    def __init__(self, path):
+        self.path = path
+        self.baseline_path = path + BASELINE_SUFFIX
+
+    def position(self, job):
+        # Returns (journal id, offset) if the journal is complete up to now
+        # for this selection, else None.
+        try:
+            with open(self.path, 'rb') as f:
+                current = self._position(f, job)
+        except (OSError, ValueError):
+            return None
+        return None if current is None else (current[0]['id'], current[1])
+
+    def _position(self, f, job):
+        # Returns (header, offset) for the open journal f, or None.
+        if time.time() - os.fstat(f.fileno()).st_mtime > STALE_AFTER:
+            return None
+        header = json.loads(f.readline())
+        end = _complete_size(f)
+        f.seek(max(0, end - 4096))
+        lines = f.read(end - f.tell()).splitlines()
+        if not isinstance(header, dict) or header.get('type') != 'journal' or any(header.get(key) != value for key, value in job.items()):
+            return None
+        if lines and lines[-1] in (json.dumps([OVERFLOWED]).encode(), json.dumps([STOPPED]).encode()):
+            return None
+        return header, end
+
+    def work_list(self, job):
+        # Rebuilds the file list from the last baseline and the events since,
+        # returning ((journal id, offset), [(path, stat)]) or None when a full
+        # scan is needed.
+        baseline = self._read_baseline()
+        if baseline is None:
+            return None
+        header, entries = baseline
+        if header['job'] != job:
+            return None
+        try:
+            # One handle throughout, in case the watcher compacts the journal meanwhile.
+            with open(self.path, 'rb') as f:
+                current = self._position(f, job)
+                if current is None:
+                    return None
+                journal_header, end = current
+                start = header['offset']
+                if header['journal_id'] != journal_header['id']:
+                    # The baseline predates a compaction; events it had not seen are only still here
+                    # if it was taken at or after the point the compacted journal continues from.
+                    if header['journal_id'] != journal_header.get('continues') or start < journal_header['continues_at']:
+                        return None
+                    f.seek(0)
+                    start = len(f.readline()) + start - journal_header['continues_at']
+                f.seek(start)
+                data = f.read(end - start)
+        except (OSError, ValueError):
+            return None
+        position = journal_header['id'], end
+        changed, deleted = {}, {}
+        for seq, line in enumerate(data.splitlines()):
+            event = json.loads(line)
+            if event[0] == CHANGED:
+                changed[event[1]] = seq
+            elif event[0] == DELETED:
+                deleted[event[1]] = seq
+            else:
+                return None
+
+        def removed_after(path, seq):
+            while True:
+                if deleted.get(path, -1) > seq:
+                    return True
+                parent = os.path.dirname(path)
+                if parent == path:
+                    return False
+                path = parent
+
+        scanned = []
+        for path, stat in entries:
+            if path not in changed and not (deleted and removed_after(path, -1)):
+                scanned.append((path, stat))
+        for path, seq in changed.items():
+            if deleted and removed_after(path, seq):
+                continue
+            try:
+                scanned.append((path, os.stat(path)))
+            except OSError:
+                continue
+        logging.info(f"Change journal {self.path}: {len(changed)} changed, {len(deleted)} deleted since the last backup")
+        return position, scanned
+
+    def write_baseline(self, job, position, scanned):
+        temp_path = self.baseline_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'journal_id': position[0], 'offset': position[1], 'job': job}) + '\n')
+            for path, stat in scanned:
+                if stat is None:
+                    f.write(json.dumps([path]) + '\n')
+                else:
+                    f.write(json.dumps([path, stat.st_size, stat.st_dev, stat.st_ino, stat.st_nlink]) + '\n')
+        os.replace(temp_path, self.baseline_path)
+
+    def baseline_position(self):
+        # Returns the (journal id, offset) of the baseline without its file list, or None.
+        try:
+            with open(self.baseline_path, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline())
+            return header['journal_id'], header['offset']
+        except (OSError, ValueError, TypeError, KeyError):
+            return None
+
+    def _read_baseline(self):
+        try:
+            with open(self.baseline_path, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline())
+                entries = []
+                for line in f:
+                    entry = json.loads(line)
+                    entries.append((entry[0], FileStat(*entry[1:]) if len(entry) > 1 else None))
+            return header, entries
+        except (OSError, ValueError, TypeError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logging.warning(f"Ignoring unreadable change journal baseline {self.baseline_path}: {e}")
+            return None
+
+
+class WatchLimitError(Exception):
+    pass
+
+
+class ChangeWatcher(threading.Thread):
+    # Linux only: keeps the journal for one backup selection up to date with
+    # inotify. Every directory in the selection needs its own watch, so very
+    # large trees may need fs.inotify.max_user_watches raised.
+    def __init__(self, journal_path, files, include_subdirs=True, path_filter=None):
+        super().__init__(daemon=True)
+        self.journal_path = journal_path
+        self.files = list(files)
+        self.include_subdirs = include_subdirs
+        self.path_filter = path_filter
+        self.libc = _load_libc()
+        self._stop_event = threading.Event()
+        self._fd = None
+        self._journal = None
+        self._watches = {}
+        self._file_roots = {}
+        self._pending = {}
+        self._last_flush = 0.0
+        self._header = None
+        self._header_size = 0
+        self._baseline_mtime = None
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def run(self):
+        if self.libc is None:
+            logging.error("Change journal needs Linux inotify; backups will scan the full tree")
+            return
+        try:
+            self._start_journal()
+            while not self._stop_event.is_set():
+                readable, _, _ = select.select([self._fd], [], [], FLUSH_INTERVAL)
+                if readable:
+                    self._read_events()
+                if time.monotonic() - self._last_flush >= FLUSH_INTERVAL or len(self._pending) >= MAX_PENDING:
+                    self._flush()
+                    self._compact_if_consumed()
+            self._flush()
+            self._append([STOPPED])
+        except WatchLimitError as e:
+            logging.error(f"Change journal {self.journal_path} stopped: {e}")
+            self._append([OVERFLOWED])
+        except Exception as e:
+            logging.error(f"Change journal {self.journal_path} failed: {e}", exc_info=True)
+            self._append([STOPPED])
+        finally:
+            self._close()
+
+    def _start_journal(self):
+        # Watches are set up before the header is written, so a backup that
+        # sees this journal id scans a tree whose changes are all being caught.
+        self._close()
+        self._fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self._watches, self._file_roots, self._pending = {}, {}, {}
+        for item in self.files:
+            if os.path.isdir(item):
+                self._watch_tree(item, item, [], created=False)
+            elif os.path.isfile(item):
+                directory = os.path.dirname(item)
+                self._file_roots.setdefault(directory, set()).add(os.path.basename(item))
+                wd = self._add_watch(directory)
+                if wd is not None:
+                    self._watches.setdefault(wd, (directory, None, None))
+        header = {'type': 'journal', 'id': uuid.uuid4().hex, 'started': datetime.now().isoformat()}
+        header.update(journal_job(self.files, self.include_subdirs, self.path_filter))
+        self._write_journal(header, b'')
+        self._last_flush = time.monotonic()
+        logging.info(f"Change journal {self.journal_path} started with {len(self._watches)} watches")
+
+    def _write_journal(self, header, events):
+        line = (json.dumps(header) + '\n').encode('utf-8')
+        temp_path = self.journal_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(line)
+            f.write(events)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.journal_path)
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        self._header = header
+        self._header_size = len(line)
+
+    def _compact_if_consumed(self):
+        # Runs after a flush, so every event so far is in the file and is kept
+        # if the baseline has not consumed it yet.
+        try:
+            mtime = os.path.getmtime(self.journal_path + BASELINE_SUFFIX)
+        except OSError:
+            return
+        if mtime == self._baseline_mtime:
+            return
+        self._baseline_mtime = mtime
+        position = ChangeJournal(self.journal_path).baseline_position()
+        if position is None or position[0] != self._header['id'] or position[1] <= self._header_size:
+            return
+        self._journal.close()
+        self._journal = None
+        with open(self.journal_path, 'rb') as f:
+            f.seek(position[1])
+            events = f.read()
+        consumed = position[1] - self._header_size
+        header = dict(self._header, id=uuid.uuid4().hex, continues=position[0], continues_at=position[1])
+        self._write_journal(header, events)
+        logging.info(f"Compacted change journal {self.journal_path}: dropped {consumed} bytes of consumed events")
+
+    def _restart(self, reason):
+        logging.warning(f"Restarting change journal {self.journal_path}: {reason}")
+        self._start_journal()
+
+    def _close(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _add_watch(self, directory):
+        wd = self.libc.inotify_add_watch(self._fd, os.fsencode(directory or '.'), WATCH_MASK)
+        if wd >= 0:
+            return wd
+        error = ctypes.get_errno()
+        if error == errno.ENOSPC:
+            raise WatchLimitError(f"inotify watch limit reached at {directory}")
+        # The directory vanished or cannot be read; a full scan could not list it either.
+        return None
+
+    def _watch_tree(self, top, path, rules, created):
+        stack = [(path, rules)]
+        while stack:
+            directory, rules = stack.pop()
+            wd = self._add_watch(directory)
+            if wd is None:
+                continue
+            try:
+                with os.scandir(directory) as entries:
+                    dirs, links, files = [], set(), []
+                    for entry in entries:
+                        if entry.is_dir():
+                            dirs.append(entry.name)
+                            if entry.is_symlink():
+                                links.add(entry.name)
+                        else:
+                            files.append(entry.name)
+            except OSError:
+                continue
+            if self.path_filter is not None:
+                dirs, files, rules = self.path_filter.filter_listing(top, directory, dirs, files, rules)
+            self._watches[wd] = (directory, top, rules)
+            if created:
+                for name in files:
+                    self._record(os.path.join(directory, name), CHANGED)
+            if self.include_subdirs:
+                stack.extend((os.path.join(directory, name), rules) for name in dirs if name not in links)
+
+    def _unwatch_tree(self, path):
+        prefix = path + os.sep
+        for wd, (directory, _, _) in list(self._watches.items()):
+            if directory == path or directory.startswith(prefix):
+                self.libc.inotify_rm_watch(self._fd, wd)
+                del self._watches[wd]
+
+    def _read_events(self):
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                name = os.fsdecode(data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].split(b'\0', 1)[0])
+                offset += EVENT_HEADER.size + length
+                if not self._handle(wd, mask, name):
+                    # The journal restarted; the rest of this buffer refers to old watches.
+                    return
+
+    def _handle(self, wd, mask, name):
+        if mask & IN_Q_OVERFLOW:
+            self._restart("event queue overflowed")
+            return False
+        if mask & IN_IGNORED:
+            self._watches.pop(wd, None)
+            return True
+        watch = self._watches.get(wd)
+        if watch is None:
+            return True
+        directory, top, rules = watch
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            if directory in self.files:
+                self._restart(f"{directory} was moved or deleted")
+                return False
+            return True
+        if top is not None and name == GITIGNORE_FILE and self.path_filter is not None and self.path_filter.use_gitignore:
+            self._restart(f"{os.path.join(directory, name)} changed")
+            return False
+        path = os.path.join(directory, name)
+        if mask & IN_ISDIR:
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self._unwatch_tree(path)
+                self._record(path, DELETED)
+            elif mask & (IN_CREATE | IN_MOVED_TO) and self._accepts(directory, top, rules, name, True):
+                self._watch_tree(top, path, rules, created=True)
+        elif self._accepts(directory, top, rules, name, False):
+            self._record(path, DELETED if mask & (IN_DELETE | IN_MOVED_FROM) else CHANGED)
+        return True
+
+    def _accepts(self, directory, top, rules, name, is_dir):
+        if not is_dir and name in self._file_roots.get(directory, ()):
+            return True
+        if top is None or is_dir and not self.include_subdirs:
+            return False
+        if self.path_filter is None:
+            return True
+        dirs, files, _ = self.path_filter.filter_listing(top, directory, [name] if is_dir else [], [] if is_dir else [name], rules)
+        return bool(dirs or files)
+
+    def _record(self, path, op):
+        # Re-inserting keeps the pending events in the order they last happened.
+        self._pending.pop(path, None)
+        self._pending[path] = op
+
+    def _flush(self):
+        if self._pending:
+            self._journal.write(''.join(json.dumps([op, path]) + '\n' for path, op in self._pending.items()))
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._pending = {}
+        else:
+            # Heartbeat, so backups can tell a live journal from a dead one.
+            os.utime(self.journal_path)
+        self._last_flush = time.monotonic()
+
+    def _append(self, event):
+        try:
+            if self._journal is None:
+                self._journal = open(self.journal_path, 'a', encoding='utf-8')
+            self._journal.write(json.dumps(event) + '\n')
+            self._journal.flush()
+        except Exception as e:
+            logging.error(f"Error writing to change journal {self.journal_path}: {e}", exc_info=True)
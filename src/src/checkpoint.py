@@ -0,0 +1,87 @@
+import os
+import json
+import hashlib
+import logging
+
+CHECKPOINT_SUFFIX = '.ckpt'
+RESTORE_CHECKPOINT = '.restore.ckpt'
+CHECKPOINT_INTERVAL = 10.0
+TAIL_SIZE = 64 * 1024
+
+# A checkpoint log is a JSON-lines file: the first line describes the job, and
+# each later line records a point up to which the output is known to be
+# complete and durable. A torn final line left by a crash is ignored.
+
+
+def backup_checkpoint_path(backup_path):
+    return backup_path + CHECKPOINT_SUFFIX
+
+
+def restore_checkpoint_path(restore_dir):
+    return os.path.join(restore_dir, RESTORE_CHECKPOINT)
+
+
+def tail_checksum(f, offset):
+    # Hashes the TAIL_SIZE bytes before offset, which is enough to tell whether
+    # the end of a partial file is still what the checkpoint saw.
+    position = f.tell()
+    start = max(0, offset - TAIL_SIZE)
+    f.seek(start)
+    data = f.read(offset - start)
+    f.seek(position)
+    if len(data) != offset - start:
+        return None
+    return hashlib.blake2b(data).hexdigest()
+
+
+def fsync_path(path, flags=os.O_RDONLY):
+    fd = os.open(path, flags)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class CheckpointLog:
+    def __init__(self, path):
+        self.path = path
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def start(self, job):
+        self.rewrite(job, [])
+
+    def append(self, record):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load(self):
+        records = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    logging.warning(f"Ignoring torn checkpoint record in {self.path}")
+                    break
+        if not records:
+            raise ValueError(f"Checkpoint file {self.path} is empty")
+        return records[0], records[1:]
+
+    def rewrite(self, job, records):
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for record in [job] + records:
+                f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
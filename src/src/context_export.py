@@ -0,0 +1,265 @@
+import os
+import codecs
+import logging
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from PyQt5.QtCore import QThread, pyqtSignal
+from metrics import JobMetrics, JobProfiler
+from path_filter import walk
+from utils import format_size
+
+SNIFF_SIZE = 8192
+READ_WORKERS = 16
+BYTES_PER_TOKEN = 4
+DEFAULT_MAX_FILE_TOKENS = 16000
+DEFAULT_MAX_TOTAL_TOKENS = 200000
+
+SOURCE_EXTENSIONS = {'.py', '.pyi', '.js', '.jsx', '.ts', '.tsx', '.java', '.kt', '.scala', '.go', '.rs', '.c', '.h',
+                     '.cc', '.cpp', '.hpp', '.cs', '.rb', '.php', '.swift', '.m', '.sh', '.bash', '.ps1', '.sql',
+                     '.html', '.css', '.scss', '.vue', '.svelte', '.lua', '.r', '.pl', '.dart', '.ex', '.exs'}
+DOC_EXTENSIONS = {'.md', '.rst', '.txt', '.adoc'}
+CONFIG_EXTENSIONS = {'.toml', '.ini', '.cfg', '.yaml', '.yml', '.conf', '.env', '.properties', '.gradle'}
+CONFIG_NAMES = {'makefile', 'dockerfile', 'requirements.txt', 'setup.py', 'pyproject.toml', 'package.json',
+                'cargo.toml', 'go.mod', '.gitignore'}
+GENERATED_NAMES = {'package-lock.json', 'yarn.lock', 'pnpm-lock.yaml', 'poetry.lock', 'pipfile.lock', 'cargo.lock',
+                   'composer.lock', 'gemfile.lock', 'go.sum', 'uv.lock'}
+MINIFIED_LINE_LENGTH = 1000
+# Files left out are listed at the end of the export, up to this many.
+OMITTED_LIST_LIMIT = 50
+CONTROL_BYTES = bytes(b for b in range(32) if b not in (9, 10, 12, 13))
+
+# Lower numbers are exported first.
+PRIORITY_SOURCE, PRIORITY_CONFIG, PRIORITY_DOC, PRIORITY_DATA, PRIORITY_GENERATED = range(5)
+
+Candidate = namedtuple('Candidate', ['path', 'size', 'priority', 'binary'])
+
+
+def sniff(path):
+    with open(path, 'rb') as f:
+        return f.read(SNIFF_SIZE)
+
+
+def is_binary(head):
+    if b'\0' in head:
+        return True
+    try:
+        # Incremental decode tolerates a multi-byte character cut off at the end of the sample.
+        codecs.getincrementaldecoder('utf-8')().decode(head, final=False)
+    except UnicodeDecodeError:
+        return True
+    control = len(head) - len(head.translate(None, CONTROL_BYTES))
+    return bool(head) and control / len(head) > 0.1
+
+
+def classify(path, head):
+    name = os.path.basename(path).lower()
+    ext = os.path.splitext(name)[1]
+    average_line = len(head) / (head.count(b'\n') + 1)
+    if name in GENERATED_NAMES or '.min.' in name or average_line > MINIFIED_LINE_LENGTH:
+        return PRIORITY_GENERATED
+    if name in CONFIG_NAMES or ext in CONFIG_EXTENSIONS:
+        return PRIORITY_CONFIG
+    if ext in SOURCE_EXTENSIONS:
+        return PRIORITY_SOURCE
+    if ext in DOC_EXTENSIONS or name.startswith('readme'):
+        return PRIORITY_DOC
+    return PRIORITY_DATA
+
+
+def encoded_size(text):
+    return len(text.encode('utf-8', errors='replace'))
+
+
+def entry_header(path):
+    return f"--- {path} ---\n"
+
+
+def truncation_marker(length, size):
+    return f"[... truncated {size - length} of {size} bytes ...]\n"
+
+
+def omitted_line(candidate, reason):
+    return f"{candidate.path} ({format_size(candidate.size)}, {reason})\n"
+
+
+def omitted_more(count):
+    return f"... and {count} more\n"
+
+
+OMITTED_HEADER = "--- omitted files ---\n"
+
+
+def decode_within(data, limit):
+    # Replacement characters take more bytes than the ones they replace (a
+    # character cut off by truncation, say), so the text is cut back to limit.
+    text = data.decode('utf-8', errors='replace')
+    encoded = text.encode('utf-8')
+    if len(encoded) > limit:
+        text = encoded[:limit].decode('utf-8', errors='ignore')
+    return text
+
+
+class ContextExporter(QThread):
+    progress_updated = pyqtSignal(int)
+    file_processed = pyqtSignal(str)
+    export_completed = pyqtSignal(str)
+    export_failed = pyqtSignal(str)
+    job_summary = pyqtSignal(dict)
+
+    def __init__(self, files, output_path, include_subdirs=True, path_filter=None, max_file_tokens=DEFAULT_MAX_FILE_TOKENS,
+                 max_file_bytes=None, max_total_tokens=DEFAULT_MAX_TOTAL_TOKENS, max_total_bytes=None,
+                 include_generated=False, profile=False):
+        super().__init__()
+        self.files = files
+        self.output_path = output_path
+        self.include_subdirs = include_subdirs
+        self.path_filter = path_filter
+        self.max_file_bytes = max_file_tokens * BYTES_PER_TOKEN
+        if max_file_bytes is not None:
+            self.max_file_bytes = min(self.max_file_bytes, max_file_bytes)
+        self.max_total_bytes = max_total_tokens * BYTES_PER_TOKEN
+        if max_total_bytes is not None:
+            self.max_total_bytes = min(self.max_total_bytes, max_total_bytes)
+        self.include_generated = include_generated
+        self.profile = profile
+        self.metrics = None
+
+    def run(self):
+        self.metrics = JobMetrics('export')
+        try:
+            if self.profile:
+                with JobProfiler(self.metrics):
+                    self.export()
+            else:
+                self.export()
+            logging.info(f"Context export completed at {self.output_path}")
+            self.export_completed.emit(self.output_path)
+        except Exception as e:
+            self.metrics.count('errors')
+            logging.error(f"Context export failed: {e}", exc_info=True)
+            self.export_failed.emit(str(e))
+        finally:
+            self.metrics.finish()
+            self.metrics.write_json()
+            self.job_summary.emit(self.metrics.summary())
+
+    def _scan(self):
+        for item in self.files:
+            if os.path.isdir(item):
+                for root, _, files in walk(item, self.path_filter, self.include_subdirs):
+                    for file in sorted(files):
+                        yield os.path.join(root, file)
+            elif os.path.isfile(item):
+                yield item
+
+    def _inspect(self, path):
+        try:
+            size = os.path.getsize(path)
+            head = sniff(path)
+        except OSError as e:
+            logging.error(f"Error reading file {path}: {e}", exc_info=True)
+            self.metrics.count('errors')
+            return None
+        binary = is_binary(head)
+        priority = PRIORITY_DATA if binary else classify(path, head)
+        return Candidate(path, size, priority, binary)
+
+    def _read(self, candidate, length):
+        with open(candidate.path, 'rb') as f:
+            return f.read(length)
+
+    def plan(self, candidates, reserved=0):
+        # Decides up front how many bytes of each file fit in the budgets, so the
+        # reads can run in parallel while the output stays in priority order.
+        # Every line written is charged to the budget, including the list of
+        # files left out, of which only the first `listed` fit; the rest are
+        # summed up in an "... and K more" line.
+        ordered = sorted(candidates, key=lambda c: (c.priority, c.path.count(os.sep), c.path))
+        # Room for the list header and the "... and K more" line is kept back from the start.
+        budget = (self.max_total_bytes - reserved - encoded_size(OMITTED_HEADER)
+                  - encoded_size(omitted_more(len(candidates))))
+        # So is room for the first OMITTED_LIST_LIMIT lines of the list. Keeping
+        # it back can leave out more files, so the list is planned again until
+        # the room kept back covers it.
+        list_room = 0
+        while True:
+            planned, omitted, remaining = self._plan_contents(ordered, budget - list_room)
+            lines = [encoded_size(omitted_line(candidate, reason)) for candidate, reason in omitted[:OMITTED_LIST_LIMIT]]
+            if sum(lines) <= list_room:
+                break
+            list_room = sum(lines)
+        remaining += list_room
+        listed = 0
+        for line in lines:
+            if line > remaining:
+                break
+            listed += 1
+            remaining -= line
+        return planned, omitted, listed
+
+    def _plan_contents(self, ordered, remaining):
+        planned, omitted = [], []
+        for candidate in ordered:
+            if candidate.binary:
+                reason = 'binary'
+            elif candidate.priority == PRIORITY_GENERATED and not self.include_generated:
+                reason = 'generated'
+            else:
+                # The header, a newline added after the content and the blank line.
+                overhead = encoded_size(entry_header(candidate.path)) + 2
+                length = min(candidate.size, self.max_file_bytes, remaining - overhead)
+                if length < candidate.size:
+                    overhead += encoded_size(truncation_marker(0, candidate.size))
+                    length = min(length, remaining - overhead)
+                if length > 0 or length == candidate.size:
+                    planned.append((candidate, length))
+                    remaining -= length + overhead
+                    continue
+                reason = 'over budget'
+            omitted.append((candidate, reason))
+        return planned, omitted, remaining
+
+    def export(self):
+        with self.metrics.phase('scan'):
+            paths = list(self._scan())
+        with ThreadPoolExecutor(max_workers=READ_WORKERS) as pool:
+            with self.metrics.phase('classify'):
+                candidates = [c for c in pool.map(self._inspect, paths) if c is not None]
+            title = f"Project context exported on {datetime.now().isoformat()}\n\n"
+            planned, omitted, listed = self.plan(candidates, reserved=encoded_size(title))
+
+            with open(self.output_path, 'w', encoding='utf-8', newline='\n') as out:
+                out.write(title)
+                contents = pool.map(lambda item: self._timed_read(*item), planned)
+                for index, ((candidate, length), (data, seconds)) in enumerate(zip(planned, contents)):
+                    start = time.perf_counter()
+                    with self.metrics.phase('write'):
+                        out.write(entry_header(candidate.path))
+                        text = decode_within(data, length)
+                        out.write(text)
+                        if not text.endswith('\n'):
+                            out.write('\n')
+                        if length < candidate.size:
+                            out.write(truncation_marker(length, candidate.size))
+                        out.write('\n')
+                    self.metrics.record_file(seconds + time.perf_counter() - start, length)
+                    self.progress_updated.emit(int((index + 1) / len(planned) * 100))
+                    self.file_processed.emit(f"{candidate.path} ({format_size(length)})")
+
+                if omitted:
+                    out.write(OMITTED_HEADER)
+                    for candidate, reason in omitted[:listed]:
+                        out.write(omitted_line(candidate, reason))
+                    if listed < len(omitted):
+                        out.write(omitted_more(len(omitted) - listed))
+        over_budget = sum(1 for _, reason in omitted if reason == 'over budget')
+        self.metrics.count('omitted', over_budget)
+        self.metrics.count('skipped', len(omitted) - over_budget)
+
+    def _timed_read(self, candidate, length):
+        start = time.perf_counter()
+        with self.metrics.phase('read'):
+            data = self._read(candidate, length)
+        return data, time.perf_counter() - start
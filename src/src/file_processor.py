@@ -2,13 +2,18 @@ import os
 import shutil
 import zipfile
 import json
+import logging
+import time
 from PyQt5.QtCore import QThread, pyqtSignal
+from metrics import JobMetrics, JobProfiler
+from path_filter import walk
 
 class FileProcessor(QThread):
     progress_updated = pyqtSignal(int)
     file_processed = pyqtSignal(str)
     processing_completed = pyqtSignal()
     processing_failed = pyqtSignal(str)
+    job_summary = pyqtSignal(dict)
 
     def __init__(self, action, source_paths, destination_path, options):
         super().__init__()
@@ -16,69 +21,116 @@ class FileProcessor(QThread):
         self.source_paths = source_paths
         self.destination_path = destination_path
         self.options = options
+        self.path_filter = (options or {}).get('path_filter')
+        self.metrics = None
 
     def run(self):
+        self.metrics = JobMetrics(self.action)
         try:
-            if self.action == 'copy':
-                self._copy_files()
-            elif self.action == 'move':
-                self._move_files()
-            elif self.action == 'zip':
-                self._zip_files()
-            elif self.action == 'unzip':
-                self._unzip_files()
-            elif self.action == 'delete':
-                self._delete_files()
+            if (self.options or {}).get('profile'):
+                with JobProfiler(self.metrics):
+                    self._run_action()
+            else:
+                self._run_action()
             self.processing_completed.emit()
         except Exception as e:
+            self.metrics.count('errors')
+            logging.error(f"File processing failed: {e}", exc_info=True)
             self.processing_failed.emit(str(e))
+        finally:
+            self.metrics.finish()
+            self.metrics.write_json()
+            self.job_summary.emit(self.metrics.summary())
+
+    def _run_action(self):
+        if self.action == 'copy':
+            self._copy_files()
+        elif self.action == 'move':
+            self._move_files()
+        elif self.action == 'zip':
+            self._zip_files()
+        elif self.action == 'unzip':
+            self._unzip_files()
+        elif self.action == 'delete':
+            self._delete_files()
+
+    def _timed(self, phase, func, path, *args):
+        start = time.perf_counter()
+        with self.metrics.phase(phase):
+            result = func(path, *args)
+        size = os.path.getsize(path) if os.path.isfile(path) else 0
+        self.metrics.record_file(time.perf_counter() - start, size)
+        return result
+
+    def _timed_copy(self, src, dst):
+        return self._timed('write', shutil.copy2, src, dst)
 
     def _copy_files(self):
         for source in self.source_paths:
             if os.path.isfile(source):
-                shutil.copy2(source, self.destination_path)
+                self._timed_copy(source, self.destination_path)
                 self.file_processed.emit(f"Copied: {source}")
             elif os.path.isdir(source):
                 dest_dir = os.path.join(self.destination_path, os.path.basename(source))
-                shutil.copytree(source, dest_dir)
+                if self.path_filter is None:
+                    shutil.copytree(source, dest_dir, copy_function=self._timed_copy)
+                else:
+                    self._copy_filtered_tree(source, dest_dir)
                 self.file_processed.emit(f"Copied directory: {source}")
 
+    def _copy_filtered_tree(self, source, dest_dir):
+        for root, _, files in walk(source, self.path_filter):
+            target_root = os.path.join(dest_dir, os.path.relpath(root, source))
+            os.makedirs(target_root, exist_ok=True)
+            for file in files:
+                self._timed_copy(os.path.join(root, file), os.path.join(target_root, file))
+        shutil.copystat(source, dest_dir)
+
     def _move_files(self):
         for source in self.source_paths:
             dest = os.path.join(self.destination_path, os.path.basename(source))
-            shutil.move(source, dest)
+            with self.metrics.phase('write'):
+                shutil.move(source, dest)
+            self.metrics.count('files')
             self.file_processed.emit(f"Moved: {source}")
 
     def _zip_files(self):
         with zipfile.ZipFile(self.destination_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
             for source in self.source_paths:
                 if os.path.isfile(source):
-                    zipf.write(source, os.path.basename(source))
+                    self._timed('transform', zipf.write, source, os.path.basename(source))
                     self.file_processed.emit(f"Added to zip: {source}")
                 elif os.path.isdir(source):
-                    for root, _, files in os.walk(source):
+                    with self.metrics.phase('scan'):
+                        walked = list(walk(source, self.path_filter))
+                    for root, _, files in walked:
                         for file in files:
                             file_path = os.path.join(root, file)
                             arcname = os.path.relpath(file_path, os.path.dirname(source))
-                            zipf.write(file_path, arcname)
+                            self._timed('transform', zipf.write, file_path, arcname)
                             self.file_processed.emit(f"Added to zip: {file_path}")
 
     def _unzip_files(self):
         with zipfile.ZipFile(self.source_paths[0], 'r') as zipf:
-            zipf.extractall(self.destination_path)
-            for file in zipf.namelist():
-                self.file_processed.emit(f"Extracted: {file}")
+            for info in zipf.infolist():
+                start = time.perf_counter()
+                with self.metrics.phase('write'):
+                    zipf.extract(info, self.destination_path)
+                self.metrics.record_file(time.perf_counter() - start, info.file_size)
+                self.file_processed.emit(f"Extracted: {info.filename}")
 
     def _delete_files(self):
         for source in self.source_paths:
             if os.path.isfile(source):
-                os.remove(source)
+                self._timed('write', os.remove, source)
                 self.file_processed.emit(f"Deleted: {source}")
             elif os.path.isdir(source):
-                shutil.rmtree(source)
+                with self.metrics.phase('write'):
+                    shutil.rmtree(source)
+                self.metrics.count('files')
                 self.file_processed.emit(f"Deleted directory: {source}")
 
 def process_files(action, source_paths, destination_path, options=None):
     processor = FileProcessor(action, source_paths, destination_path, options)
     processor.start()
-    return processor
\ No newline at end of file
+    return processor
@@ -8,9 +8,15 @@ import json
 import string
 import random
 import logging
+from datetime import datetime
 from backup_restore import BackupRestoreHandler
+from checkpoint import backup_checkpoint_path, restore_checkpoint_path
+from context_export import ContextExporter, DEFAULT_MAX_FILE_TOKENS, DEFAULT_MAX_TOTAL_TOKENS
 from file_processor import FileProcessor
-from utils import generate_file_tree
+from metrics import format_summary
+from path_filter import COMMON_EXCLUDES, PathFilter, split_patterns
+from tree_scanner import TreeNode, TreeScanner
+from utils import format_size
 
 SETTINGS_FILE = 'settings.json'
 
@@ -37,6 +43,17 @@ class FileListWidget(QListWidget):
                     self.addItem(file_path)
                     self.main_window.files.append(file_path)
 
+class SizeTreeItem(QTreeWidgetItem):
+    # Sorts by the value stored under Qt.UserRole, so re-sorting by size uses
+    # the cached scan results instead of parsing the displayed text.
+    def __lt__(self, other):
+        column = self.treeWidget().sortColumn() if self.treeWidget() else 0
+        if column == 0:
+            return self.text(0).lower() < other.text(0).lower()
+        key = self.data(column, Qt.UserRole)
+        other_key = other.data(column, Qt.UserRole)
+        return (-1 if key is None else key) < (-1 if other_key is None else other_key)
+
 class BackupRestoreApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -158,12 +175,50 @@ class BackupRestoreApp(QMainWindow):
         options_layout.addWidget(self.subdirs_cb)
         options_layout.addWidget(QLabel("Encryption Key:"))
         options_layout.addWidget(self.encryption_key_input)
+        self.profile_cb = QCheckBox("Profile next run (cProfile + tracemalloc)")
+        self.profile_cb.toggled.connect(lambda checked: self.save_settings({'profile_next_run': checked}))
+        options_layout.addWidget(self.profile_cb)
+
+        filter_group = QGroupBox("Filters (used by Backup, File Tree and File Processor)")
+        filter_layout = QVBoxLayout(filter_group)
+        self.include_patterns_input = QLineEdit()
+        self.include_patterns_input.setPlaceholderText("e.g. *.py, docs/** (empty includes everything)")
+        self.exclude_patterns_input = QLineEdit()
+        self.exclude_patterns_input.setPlaceholderText("e.g. " + ", ".join(COMMON_EXCLUDES))
+        self.common_excludes_btn = QPushButton("Use Common Excludes")
+        self.common_excludes_btn.clicked.connect(lambda: self.exclude_patterns_input.setText(", ".join(COMMON_EXCLUDES)))
+        self.gitignore_cb = QCheckBox("Honor .gitignore files")
+        filter_layout.addWidget(QLabel("Include patterns:"))
+        filter_layout.addWidget(self.include_patterns_input)
+        filter_layout.addWidget(QLabel("Exclude patterns:"))
+        exclude_layout = QHBoxLayout()
+        exclude_layout.addWidget(self.exclude_patterns_input)
+        exclude_layout.addWidget(self.common_excludes_btn)
+        filter_layout.addLayout(exclude_layout)
+        filter_layout.addWidget(self.gitignore_cb)
 
         control_group = QGroupBox("Control")
         control_layout = QVBoxLayout(control_group)
         self.backup_btn = QPushButton("Start Backup")
         self.backup_btn.clicked.connect(self.start_backup)
+        self.resume_backup_btn = QPushButton("Resume Interrupted Backup")
+        self.resume_backup_btn.clicked.connect(self.resume_backup)
         control_layout.addWidget(self.backup_btn)
+        control_layout.addWidget(self.resume_backup_btn)
+
+        export_group = QGroupBox("LLM Context Export")
+        export_layout = QHBoxLayout(export_group)
+        self.export_file_tokens_input = QLineEdit(str(DEFAULT_MAX_FILE_TOKENS))
+        self.export_tokens_input = QLineEdit(str(DEFAULT_MAX_TOTAL_TOKENS))
+        self.export_generated_cb = QCheckBox("Include lockfiles and minified files")
+        self.export_btn = QPushButton("Export for LLM")
+        self.export_btn.clicked.connect(self.start_context_export)
+        export_layout.addWidget(QLabel("Tokens per file:"))
+        export_layout.addWidget(self.export_file_tokens_input)
+        export_layout.addWidget(QLabel("Token budget:"))
+        export_layout.addWidget(self.export_tokens_input)
+        export_layout.addWidget(self.export_generated_cb)
+        export_layout.addWidget(self.export_btn)
 
         log_group = QGroupBox("Backup Log")
         backup_log_layout = QVBoxLayout(log_group)
@@ -173,7 +228,9 @@ class BackupRestoreApp(QMainWindow):
 
         backup_layout.addWidget(file_selection_group)
         backup_layout.addWidget(options_group)
+        backup_layout.addWidget(filter_group)
         backup_layout.addWidget(control_group)
+        backup_layout.addWidget(export_group)
         backup_layout.addWidget(log_group)
 
     def setup_restore_tab(self):
@@ -185,8 +242,20 @@ class BackupRestoreApp(QMainWindow):
         self.restore_btn.clicked.connect(self.start_restore)
         self.restore_last_btn = QPushButton("Restore Last Settings")
         self.restore_last_btn.clicked.connect(self.load_restore_settings)
+        self.verify_btn = QPushButton("Verify Backup")
+        self.verify_btn.clicked.connect(self.start_verify)
+        self.verify_source_cb = QCheckBox("Also verify source files against the backup")
+        self.skip_identical_cb = QCheckBox("Skip files already identical at destination (size and modification time)")
+        self.compare_checksums_cb = QCheckBox("Compare checksums when modification times differ")
+        control_layout.addWidget(self.skip_identical_cb)
+        control_layout.addWidget(self.compare_checksums_cb)
         control_layout.addWidget(self.restore_btn)
+        self.resume_restore_btn = QPushButton("Resume Interrupted Restore")
+        self.resume_restore_btn.clicked.connect(self.resume_restore)
+        control_layout.addWidget(self.resume_restore_btn)
         control_layout.addWidget(self.restore_last_btn)
+        control_layout.addWidget(self.verify_btn)
+        control_layout.addWidget(self.verify_source_cb)
 
         log_group = QGroupBox("Restore Log")
         restore_log_layout = QVBoxLayout(log_group)
@@ -215,8 +284,13 @@ class BackupRestoreApp(QMainWindow):
         tree_group = QGroupBox("File Tree")
         tree_layout = QVBoxLayout(tree_group)
         self.file_tree_widget = QTreeWidget()
-        self.file_tree_widget.setHeaderLabels(["Name"])
+        self.file_tree_widget.setHeaderLabels(["Name", "Size", "Files", "Newest"])
+        self.file_tree_widget.setSortingEnabled(True)
+        self.file_tree_widget.sortByColumn(1, Qt.DescendingOrder)
+        self.file_tree_widget.itemExpanded.connect(self.populate_tree_item)
+        self.tree_status_label = QLabel("")
         tree_layout.addWidget(self.file_tree_widget)
+        tree_layout.addWidget(self.tree_status_label)
 
         file_tree_layout.addWidget(control_group)
         file_tree_layout.addWidget(tree_group)
@@ -330,22 +404,94 @@ class BackupRestoreApp(QMainWindow):
             if not folder:
                 return
 
-            self.tree = generate_file_tree(folder)
-            self.file_tree_widget.clear()
-            self.populate_tree_widget(self.file_tree_widget.invisibleRootItem(), self.tree)
+            self.start_tree_scan(folder)
             self.save_file_tree_settings(folder)
         except Exception as e:
             logging.error(f"Error showing file tree: {e}", exc_info=True)
 
-    def populate_tree_widget(self, parent, tree):
+    def start_tree_scan(self, folder):
+        # Sizes roll up in a background scan. Items are created when their
+        # parent is expanded and updated as their subtrees finish.
+        self.tree_scanner = TreeScanner(folder, self.build_path_filter(), profile=self.consume_profile_setting())
+        self.tree_scanner.subtrees_scanned.connect(self.update_tree_items)
+        self.tree_scanner.scan_completed.connect(self.tree_scan_completed)
+        self.tree_scanner.scan_failed.connect(self.tree_scan_failed)
+        self.tree_items = {}
+        self.file_tree_widget.clear()
+        self.tree_folders_done = 0
+        root_item = self.add_tree_item(self.file_tree_widget.invisibleRootItem(), folder, self.tree_scanner.root)
+        root_item.setExpanded(True)
+        self.tree_status_label.setText(f"Scanning {folder}...")
+        self.file_tree_btn.setEnabled(False)
+        self.restore_file_tree_btn.setEnabled(False)
+        self.tree_scanner.start()
+
+    def add_tree_item(self, parent, name, entry):
+        item = SizeTreeItem(parent, [name])
+        item.entry = entry
+        item.populated = False
+        if isinstance(entry, TreeNode):
+            self.tree_items[entry.path] = item
+            item.setChildIndicatorPolicy(QTreeWidgetItem.ShowIndicator)
+        self.set_tree_item_values(item, entry)
+        return item
+
+    def set_tree_item_values(self, item, entry):
+        if isinstance(entry, TreeNode):
+            if not entry.done:
+                item.setText(1, "scanning...")
+                return
+            if entry.error:
+                item.setToolTip(0, f"Could not be read: {entry.error}")
+            files, newest = entry.files, entry.newest
+        else:
+            files, newest = None, entry.mtime
+        item.setText(1, format_size(entry.size))
+        item.setData(1, Qt.UserRole, entry.size)
+        item.setText(2, "" if files is None else str(files))
+        item.setData(2, Qt.UserRole, files)
+        item.setText(3, datetime.fromtimestamp(newest).strftime('%Y-%m-%d %H:%M') if newest is not None else "")
+        item.setData(3, Qt.UserRole, newest)
+
+    def populate_tree_item(self, item):
         try:
-            for key, value in tree.items():
-                item = QTreeWidgetItem(parent, [key])
-                if isinstance(value, dict):
-                    self.populate_tree_widget(item, value)
+            node = getattr(item, 'entry', None)
+            if not isinstance(node, TreeNode) or node.children is None or item.populated:
+                return
+            item.populated = True
+            # Sorting once after inserting every child is far cheaper than per insert.
+            self.file_tree_widget.setSortingEnabled(False)
+            for name, entry in node.children.items():
+                self.add_tree_item(item, name, entry)
+            self.file_tree_widget.setSortingEnabled(True)
+            item.setChildIndicatorPolicy(QTreeWidgetItem.DontShowIndicatorWhenChildless)
         except Exception as e:
             logging.error(f"Error populating tree widget: {e}", exc_info=True)
 
+    def update_tree_items(self, nodes):
+        for node in nodes:
+            item = self.tree_items.get(node.path)
+            if item is None:
+                continue
+            if node.done:
+                self.set_tree_item_values(item, node)
+            if item.isExpanded():
+                self.populate_tree_item(item)
+        self.tree_folders_done += sum(1 for node in nodes if node.done)
+        self.tree_status_label.setText(f"Scanning {self.tree_scanner.root_dir}... {self.tree_folders_done} folders done")
+
+    def tree_scan_completed(self, root):
+        self.tree = root
+        self.file_tree_btn.setEnabled(True)
+        self.restore_file_tree_btn.setEnabled(True)
+        self.tree_status_label.setText(f"{root.path}: {root.files} files, {format_size(root.size)}")
+
+    def tree_scan_failed(self, error_message):
+        self.file_tree_btn.setEnabled(True)
+        self.restore_file_tree_btn.setEnabled(True)
+        self.tree_status_label.setText(f"Scan failed: {error_message}")
+        QMessageBox.critical(self, "Scan Failed", f"Error: {error_message}")
+
     def export_file_tree(self):
         try:
             if not hasattr(self, 'tree'):
@@ -357,18 +503,21 @@ class BackupRestoreApp(QMainWindow):
                 return
 
             with open(export_path, 'w', encoding='utf-8') as f:
-                self.write_tree_to_file(f, self.tree)
+                f.write(f"{self.tree.path}  [{format_size(self.tree.size)}, {self.tree.files} files]\n")
+                self.write_tree_to_file(f, self.tree, 1)
             QMessageBox.information(self, "Export Complete", f"File tree exported to: {export_path}")
         except Exception as e:
             logging.error(f"Error exporting file tree: {e}", exc_info=True)
             QMessageBox.critical(self, "Export Failed", f"Failed to export file tree: {e}")
 
-    def write_tree_to_file(self, f, tree, indent=0):
+    def write_tree_to_file(self, f, node, indent=0):
         try:
-            for key, value in tree.items():
-                f.write('  ' * indent + key + '\n')
-                if isinstance(value, dict):
-                    self.write_tree_to_file(f, value, indent + 1)
+            for name, entry in sorted(node.children.items(), key=lambda item: -item[1].size):
+                if isinstance(entry, TreeNode):
+                    f.write('  ' * indent + f"{name}/  [{format_size(entry.size)}, {entry.files} files]\n")
+                    self.write_tree_to_file(f, entry, indent + 1)
+                else:
+                    f.write('  ' * indent + f"{name}  [{format_size(entry.size)}]\n")
         except Exception as e:
             logging.error(f"Error writing tree to file: {e}", exc_info=True)
 
@@ -416,27 +565,99 @@ class BackupRestoreApp(QMainWindow):
 
             self.backup_thread = BackupRestoreHandler(action='backup', files=self.files, backup_path=backup_path,
                                                       compress=self.compress_cb.isChecked(), include_subdirs=self.subdirs_cb.isChecked(),
-                                                      encryption_key=encryption_key)
+                                                      encryption_key=encryption_key, profile=self.consume_profile_setting(),
+                                                      path_filter=self.build_path_filter())
             self.backup_thread.file_processed.connect(self.log_backup_progress)
+            self.backup_thread.job_summary.connect(lambda summary: self.show_job_summary(self.backup_log, summary))
             self.backup_thread.backup_completed.connect(self.backup_completed)
             self.backup_thread.backup_failed.connect(self.backup_failed)
             self.backup_thread.start()
+            self.save_backup_settings()
 
             self.backup_btn.setEnabled(False)
             self.backup_log.clear()
         except Exception as e:
             logging.error(f"Error starting backup: {e}", exc_info=True)
 
+    def resume_backup(self):
+        try:
+            backup_path, _ = QFileDialog.getOpenFileName(self, "Select Interrupted Backup", "", "Text files (*.txt)")
+            if not backup_path:
+                return
+            if not os.path.exists(backup_checkpoint_path(backup_path)):
+                QMessageBox.warning(self, "No Checkpoint", "This backup has no checkpoint to resume from.")
+                return
+
+            encryption_key = self.encryption_key_input.text().encode('utf-8') if self.encryption_key_input.text() else None
+
+            self.backup_thread = BackupRestoreHandler(action='resume_backup', backup_path=backup_path, encryption_key=encryption_key,
+                                                      profile=self.consume_profile_setting())
+            self.backup_thread.file_processed.connect(self.log_backup_progress)
+            self.backup_thread.job_summary.connect(lambda summary: self.show_job_summary(self.backup_log, summary))
+            self.backup_thread.backup_completed.connect(self.backup_completed)
+            self.backup_thread.backup_failed.connect(self.backup_failed)
+            self.backup_thread.start()
+
+            self.backup_btn.setEnabled(False)
+            self.resume_backup_btn.setEnabled(False)
+            self.backup_log.clear()
+        except Exception as e:
+            logging.error(f"Error resuming backup: {e}", exc_info=True)
+
+    def start_context_export(self):
+        if not self.files:
+            QMessageBox.warning(self, "No Files", "Please add files or folders to export.")
+            return
+
+        try:
+            max_file_tokens = int(self.export_file_tokens_input.text())
+            max_total_tokens = int(self.export_tokens_input.text())
+        except ValueError:
+            QMessageBox.warning(self, "Invalid Input", "Please enter whole numbers for the export budgets.")
+            return
+
+        try:
+            output_path, _ = QFileDialog.getSaveFileName(self, "Save Context Export", "", "Text files (*.txt)")
+            if not output_path:
+                return
+
+            self.export_thread = ContextExporter(files=self.files, output_path=output_path, include_subdirs=self.subdirs_cb.isChecked(),
+                                                 path_filter=self.build_path_filter(), max_file_tokens=max_file_tokens,
+                                                 max_total_tokens=max_total_tokens, include_generated=self.export_generated_cb.isChecked(),
+                                                 profile=self.consume_profile_setting())
+            self.export_thread.file_processed.connect(lambda path: self.backup_log.append(f"Exported: {path}"))
+            self.export_thread.export_completed.connect(self.context_export_completed)
+            self.export_thread.export_failed.connect(self.context_export_failed)
+            self.export_thread.job_summary.connect(lambda summary: self.show_job_summary(self.backup_log, summary))
+            self.export_thread.start()
+
+            self.export_btn.setEnabled(False)
+            self.backup_log.clear()
+        except Exception as e:
+            logging.error(f"Error starting context export: {e}", exc_info=True)
+
+    def context_export_completed(self, output_path):
+        self.export_btn.setEnabled(True)
+        self.backup_log.append(f"\nContext export completed!\nSaved to: {output_path}")
+        QMessageBox.information(self, "Export Complete", f"Context saved to: {output_path}")
+
+    def context_export_failed(self, error_message):
+        self.export_btn.setEnabled(True)
+        self.backup_log.append(f"\nContext export failed: {error_message}")
+        QMessageBox.critical(self, "Export Failed", f"Error: {error_message}")
+
     def log_backup_progress(self, file_path):
         self.backup_log.append(f"Backed up: {file_path}")
 
     def backup_completed(self, backup_path):
         self.backup_btn.setEnabled(True)
+        self.resume_backup_btn.setEnabled(True)
         self.backup_log.append(f"\nBackup completed successfully!\nSaved to: {backup_path}")
         QMessageBox.information(self, "Backup Complete", f"Backup saved to: {backup_path}")
 
     def backup_failed(self, error_message):
         self.backup_btn.setEnabled(True)
+        self.resume_backup_btn.setEnabled(True)
         self.backup_log.append(f"\nBackup failed: {error_message}")
         QMessageBox.critical(self, "Backup Failed", f"Error: {error_message}")
 
@@ -452,8 +673,11 @@ class BackupRestoreApp(QMainWindow):
 
             encryption_key = self.encryption_key_input.text().encode('utf-8') if self.encryption_key_input.text() else None
 
-            self.restore_thread = BackupRestoreHandler(action='restore', backup_file=backup_file, restore_dir=restore_dir, encryption_key=encryption_key)
+            self.restore_thread = BackupRestoreHandler(action='restore', backup_file=backup_file, restore_dir=restore_dir, encryption_key=encryption_key,
+                                                       profile=self.consume_profile_setting(), skip_identical=self.skip_identical_cb.isChecked(),
+                                                       compare_checksums=self.compare_checksums_cb.isChecked())
             self.restore_thread.file_processed.connect(self.log_restore_progress)
+            self.restore_thread.job_summary.connect(lambda summary: self.show_job_summary(self.restore_log, summary))
             self.restore_thread.restore_completed.connect(self.restore_completed)
             self.restore_thread.restore_failed.connect(self.restore_failed)
             self.restore_thread.start()
@@ -463,19 +687,80 @@ class BackupRestoreApp(QMainWindow):
         except Exception as e:
             logging.error(f"Error starting restore: {e}", exc_info=True)
 
+    def resume_restore(self):
+        try:
+            restore_dir = QFileDialog.getExistingDirectory(self, "Select Directory of Interrupted Restore")
+            if not restore_dir:
+                return
+            if not os.path.exists(restore_checkpoint_path(restore_dir)):
+                QMessageBox.warning(self, "No Checkpoint", "No interrupted restore was found in this directory.")
+                return
+
+            encryption_key = self.encryption_key_input.text().encode('utf-8') if self.encryption_key_input.text() else None
+
+            self.restore_thread = BackupRestoreHandler(action='resume_restore', restore_dir=restore_dir, encryption_key=encryption_key,
+                                                       profile=self.consume_profile_setting())
+            self.restore_thread.file_processed.connect(self.log_restore_progress)
+            self.restore_thread.job_summary.connect(lambda summary: self.show_job_summary(self.restore_log, summary))
+            self.restore_thread.restore_completed.connect(self.restore_completed)
+            self.restore_thread.restore_failed.connect(self.restore_failed)
+            self.restore_thread.start()
+
+            self.restore_btn.setEnabled(False)
+            self.resume_restore_btn.setEnabled(False)
+            self.restore_log.clear()
+        except Exception as e:
+            logging.error(f"Error resuming restore: {e}", exc_info=True)
+
     def log_restore_progress(self, file_path):
         self.restore_log.append(f"Restored: {file_path}")
 
     def restore_completed(self):
         self.restore_btn.setEnabled(True)
+        self.resume_restore_btn.setEnabled(True)
         self.restore_log.append("\nRestore completed successfully!")
         QMessageBox.information(self, "Restore Complete", "Files have been restored successfully.")
 
     def restore_failed(self, error_message):
         self.restore_btn.setEnabled(True)
+        self.resume_restore_btn.setEnabled(True)
         self.restore_log.append(f"\nRestore failed: {error_message}")
         QMessageBox.critical(self, "Restore Failed", f"Error: {error_message}")
 
+    def start_verify(self):
+        try:
+            backup_file, _ = QFileDialog.getOpenFileName(self, "Select Backup File to Verify", "", "Backup files (*.txt)")
+            if not backup_file:
+                return
+
+            encryption_key = self.encryption_key_input.text().encode('utf-8') if self.encryption_key_input.text() else None
+
+            self.verify_thread = BackupRestoreHandler(action='verify', backup_file=backup_file, encryption_key=encryption_key,
+                                                      profile=self.consume_profile_setting(), verify_source=self.verify_source_cb.isChecked())
+            self.verify_thread.file_processed.connect(self.restore_log.append)
+            self.verify_thread.verify_completed.connect(self.verify_completed)
+            self.verify_thread.verify_failed.connect(self.verify_failed)
+            self.verify_thread.job_summary.connect(lambda summary: self.show_job_summary(self.restore_log, summary))
+            self.verify_thread.start()
+
+            self.verify_btn.setEnabled(False)
+            self.restore_log.clear()
+        except Exception as e:
+            logging.error(f"Error starting verify: {e}", exc_info=True)
+
+    def verify_completed(self, checked, problems):
+        self.verify_btn.setEnabled(True)
+        self.restore_log.append(f"\nVerify finished: {checked} files checked, {problems} problems found.")
+        if problems:
+            QMessageBox.warning(self, "Verify Found Problems", f"{problems} problems found in {checked} files. See the log for details.")
+        else:
+            QMessageBox.information(self, "Verify Complete", f"All {checked} files match their checksums.")
+
+    def verify_failed(self, error_message):
+        self.verify_btn.setEnabled(True)
+        self.restore_log.append(f"\nVerify failed: {error_message}")
+        QMessageBox.critical(self, "Verify Failed", f"Error: {error_message}")
+
     def add_files_processor(self):
         try:
             files, _ = QFileDialog.getOpenFileNames(self, "Select files to process")
@@ -510,10 +795,11 @@ class BackupRestoreApp(QMainWindow):
         try:
             action = self.action_combo_box.currentText().lower()
             destination = self.destination_input.text()
-            options = None
+            options = {'profile': self.consume_profile_setting(), 'path_filter': self.build_path_filter()}
 
             self.processing_thread = FileProcessor(action=action, source_paths=self.files, destination_path=destination, options=options)
             self.processing_thread.file_processed.connect(self.log_processing_progress)
+            self.processing_thread.job_summary.connect(lambda summary: self.show_job_summary(self.processing_log, summary))
             self.processing_thread.processing_completed.connect(self.processing_completed)
             self.processing_thread.processing_failed.connect(self.processing_failed)
             self.processing_thread.start()
@@ -536,6 +822,21 @@ class BackupRestoreApp(QMainWindow):
         self.processing_log.append(f"\nProcessing failed: {error_message}")
         QMessageBox.critical(self, "Processing Failed", f"Error: {error_message}")
 
+    def build_path_filter(self):
+        path_filter = PathFilter(include=split_patterns(self.include_patterns_input.text()),
+                                 exclude=split_patterns(self.exclude_patterns_input.text()),
+                                 use_gitignore=self.gitignore_cb.isChecked())
+        return None if path_filter.is_empty() else path_filter
+
+    def consume_profile_setting(self):
+        profile = self.profile_cb.isChecked()
+        if profile:
+            self.profile_cb.setChecked(False)
+        return profile
+
+    def show_job_summary(self, log_widget, summary):
+        log_widget.append("\n" + format_summary(summary))
+
     def save_settings(self, settings):
         try:
             if os.path.exists(SETTINGS_FILE):
@@ -560,6 +861,10 @@ class BackupRestoreApp(QMainWindow):
                     self.file_list.addItems(self.files)
                     self.compress_cb.setChecked(settings.get('compress', False))
                     self.subdirs_cb.setChecked(settings.get('subdirs', False))
+                    self.profile_cb.setChecked(settings.get('profile_next_run', False))
+                    self.include_patterns_input.setText(settings.get('include_patterns', ''))
+                    self.exclude_patterns_input.setText(settings.get('exclude_patterns', ''))
+                    self.gitignore_cb.setChecked(settings.get('use_gitignore', False))
         except Exception as e:
             logging.error(f"Error loading settings: {e}", exc_info=True)
 
@@ -567,7 +872,10 @@ class BackupRestoreApp(QMainWindow):
         settings = {
             'files': self.files,
             'compress': self.compress_cb.isChecked(),
-            'subdirs': self.subdirs_cb.isChecked()
+            'subdirs': self.subdirs_cb.isChecked(),
+            'include_patterns': self.include_patterns_input.text(),
+            'exclude_patterns': self.exclude_patterns_input.text(),
+            'use_gitignore': self.gitignore_cb.isChecked()
         }
         self.save_settings(settings)
 
@@ -588,8 +896,6 @@ class BackupRestoreApp(QMainWindow):
                     settings = json.load(f)
                     last_folder = settings.get('last_tree_folder')
                     if last_folder and os.path.exists(last_folder):
-                        self.tree = generate_file_tree(last_folder)
-                        self.file_tree_widget.clear()
-                        self.populate_tree_widget(self.file_tree_widget.invisibleRootItem(), self.tree)
+                        self.start_tree_scan(last_folder)
         except Exception as e:
             logging.error(f"Error loading file tree settings: {e}", exc_info=True)
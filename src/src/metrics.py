@@ -0,0 +1,139 @@
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+METRICS_FILE = 'job_metrics.jsonl'
+# Upper bounds (milliseconds) of the per-file latency histogram buckets.
+LATENCY_BUCKETS_MS = [0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000]
+
+
+class JobMetrics:
+    def __init__(self, job):
+        self.job = job
+        self.started_at = datetime.now().isoformat()
+        self.phases = {}
+        self.counters = {'files': 0, 'bytes': 0, 'errors': 0}
+        self.latency_histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.max_latency_ms = 0.0
+        self.profile = None
+        self._start = time.perf_counter()
+        self._elapsed = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase_time(name, time.perf_counter() - start)
+
+    def add_phase_time(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_file(self, seconds, size):
+        latency_ms = seconds * 1000
+        bucket = len(LATENCY_BUCKETS_MS)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if latency_ms <= bound:
+                bucket = i
+                break
+        with self._lock:
+            self.counters['files'] += 1
+            self.counters['bytes'] += size
+            self.latency_histogram[bucket] += 1
+            self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+
+    def finish(self):
+        if self._elapsed is None:
+            self._elapsed = time.perf_counter() - self._start
+
+    def summary(self):
+        elapsed = self._elapsed if self._elapsed is not None else time.perf_counter() - self._start
+        labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        with self._lock:
+            summary = {
+                'job': self.job,
+                'started_at': self.started_at,
+                'elapsed_s': round(elapsed, 6),
+                'phases_s': {name: round(seconds, 6) for name, seconds in self.phases.items()},
+                'counters': dict(self.counters),
+                'files_per_s': round(self.counters['files'] / elapsed, 2) if elapsed else None,
+                'mb_per_s': round(self.counters['bytes'] / (1024 * 1024) / elapsed, 2) if elapsed else None,
+                'file_latency_histogram': dict(zip(labels, self.latency_histogram)),
+                'max_file_latency_ms': round(self.max_latency_ms, 3),
+            }
+        if self.profile:
+            summary['profile'] = self.profile
+        return summary
+
+    def write_json(self, path=METRICS_FILE):
+        try:
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(self.summary()) + '\n')
+        except Exception as e:
+            logging.error(f"Error writing job metrics to {path}: {e}", exc_info=True)
+
+
+class JobProfiler:
+    def __init__(self, metrics, output_dir='.', top=25):
+        self.metrics = metrics
+        self.output_dir = output_dir
+        self.top = top
+        self.profiler = None
+
+    def __enter__(self):
+        self.profiler = cProfile.Profile()
+        tracemalloc.start()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        try:
+            stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+            stats_path = os.path.join(self.output_dir, f"{self.metrics.job}-{stamp}.prof")
+            self.profiler.dump_stats(stats_path)
+            stream = io.StringIO()
+            pstats.Stats(self.profiler, stream=stream).sort_stats('cumulative').print_stats(self.top)
+            self.metrics.profile = {
+                'cprofile_stats': os.path.abspath(stats_path),
+                'cprofile_top': stream.getvalue(),
+                'tracemalloc_peak_bytes': peak,
+                'tracemalloc_current_bytes': current,
+                'tracemalloc_top': [str(stat) for stat in snapshot.statistics('lineno')[:self.top]],
+            }
+        except Exception as e:
+            logging.error(f"Error saving profile for {self.metrics.job}: {e}", exc_info=True)
+        return False
+
+
+def format_summary(summary):
+    lines = [f"{summary['job']} finished in {summary['elapsed_s']:.2f}s"]
+    counters = summary['counters']
+    lines.append("  ".join(f"{name.capitalize()}: {value}" for name, value in counters.items()))
+    if summary.get('files_per_s') is not None:
+        lines.append(f"Throughput: {summary['files_per_s']} files/s, {summary['mb_per_s']} MB/s")
+    for name, seconds in summary['phases_s'].items():
+        lines.append(f"  {name}: {seconds:.3f}s")
+    lines.append("File latency: " + ", ".join(f"{label}: {count}" for label, count in summary['file_latency_histogram'].items() if count))
+    if summary.get('profile'):
+        lines.append(f"Profile saved to {summary['profile']['cprofile_stats']} "
+                     f"(peak traced memory {summary['profile']['tracemalloc_peak_bytes']} bytes)")
+    return "\n".join(lines)
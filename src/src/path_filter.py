@@ -0,0 +1,163 @@
+import os
+import re
+import logging
+from collections import namedtuple
+
+GITIGNORE_FILE = '.gitignore'
+COMMON_EXCLUDES = ['.git/', 'node_modules/', '__pycache__/', 'build/', 'dist/', '.venv/', '*.pyc']
+
+Rule = namedtuple('Rule', ['regex', 'negate', 'dir_only'])
+
+
+def compile_pattern(pattern):
+    # Compiles one line of .gitignore syntax; returns None for blanks and comments.
+    pattern = pattern.rstrip('\n').rstrip()
+    if not pattern or pattern.startswith('#'):
+        return None
+    negate = pattern.startswith('!')
+    if negate:
+        pattern = pattern[1:]
+    if pattern.startswith('\\'):
+        pattern = pattern[1:]
+    dir_only = pattern.endswith('/')
+    pattern = pattern.rstrip('/')
+    if not pattern:
+        return None
+    anchored = '/' in pattern
+    pattern = pattern.lstrip('/')
+
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('/**', i) and i + 3 == len(pattern):
+            regex += '/.*'
+            i += 3
+        elif pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '[^/]'
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+            end = pattern.index(']', i + 2)
+            body = pattern[i + 1:end]
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            regex += '[' + body.replace('\\', '\\\\') + ']'
+            i = end + 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    prefix = '' if anchored else '(?:.*/)?'
+    return Rule(re.compile(prefix + regex + r'\Z', re.DOTALL), negate, dir_only)
+
+
+def compile_patterns(patterns):
+    return [rule for rule in (compile_pattern(p) for p in patterns) if rule is not None]
+
+
+def split_patterns(text):
+    return [part.strip() for part in text.split(',') if part.strip()]
+
+
+class PathFilter:
+    def __init__(self, include=None, exclude=None, use_gitignore=False):
+        self.patterns = {'include': list(include or []), 'exclude': list(exclude or []), 'use_gitignore': use_gitignore}
+        self.include = compile_patterns(include or [])
+        self.exclude = compile_patterns(exclude or [])
+        self.use_gitignore = use_gitignore
+
+    def to_dict(self):
+        return dict(self.patterns)
+
+    @classmethod
+    def from_dict(cls, patterns):
+        return cls(patterns.get('include'), patterns.get('exclude'), patterns.get('use_gitignore', False))
+
+    def is_empty(self):
+        return not (self.include or self.exclude or self.use_gitignore)
+
+    def walk(self, top, include_subdirs=True):
+        # Like os.walk(top), but excluded directories are pruned before they are
+        # listed, so ignored subtrees cost no I/O.
+        pending_rules = {top: []}
+        for root, dirs, files in os.walk(top):
+            kept_dirs, kept_files, rules = self.filter_listing(top, root, dirs, files, pending_rules.pop(root, []))
+            if include_subdirs:
+                for name in kept_dirs:
+                    pending_rules[os.path.join(root, name)] = rules
+                dirs[:] = kept_dirs
+            else:
+                dirs[:] = []
+            files[:] = kept_files
+            yield root, dirs, files
+
+    def filter_listing(self, top, root, dirs, files, rules):
+        # Filters one directory listing. Rules are lists of (base, Rule) where
+        # base is the directory, relative to top, of the .gitignore the rule
+        # came from; the returned rules apply inside the kept subdirectories.
+        if self.use_gitignore and GITIGNORE_FILE in files:
+            rules = rules + self._load_gitignore(top, root)
+        rel_root = os.path.relpath(root, top)
+        rel_root = '' if rel_root == '.' else rel_root.replace(os.sep, '/')
+        kept_dirs = []
+        for name in dirs:
+            rel = f"{rel_root}/{name}" if rel_root else name
+            if not self._ignored(rel, True, rules):
+                kept_dirs.append(name)
+        kept_files = []
+        for name in files:
+            rel = f"{rel_root}/{name}" if rel_root else name
+            if not self._ignored(rel, False, rules) and self._included(rel):
+                kept_files.append(name)
+        return kept_dirs, kept_files, rules
+
+    def _load_gitignore(self, top, root):
+        base = os.path.relpath(root, top)
+        base = '' if base == '.' else base.replace(os.sep, '/')
+        try:
+            with open(os.path.join(root, GITIGNORE_FILE), 'r', encoding='utf-8', errors='replace') as f:
+                return [(base, rule) for rule in compile_patterns(f.readlines())]
+        except OSError as e:
+            logging.error(f"Error reading {os.path.join(root, GITIGNORE_FILE)}: {e}", exc_info=True)
+            return []
+
+    def _ignored(self, rel, is_dir, rules):
+        ignored = False
+        for base, rule in rules:
+            if rule.dir_only and not is_dir:
+                continue
+            if base and rule.regex.match(rel[len(base) + 1:]) or not base and rule.regex.match(rel):
+                ignored = not rule.negate
+        # Explicit excludes are applied last so they win over .gitignore negations.
+        for rule in self.exclude:
+            if rule.dir_only and not is_dir:
+                continue
+            if rule.regex.match(rel):
+                ignored = not rule.negate
+        return ignored
+
+    def _included(self, rel):
+        if not self.include:
+            return True
+        return any(rule.regex.match(rel) for rule in self.include if not rule.dir_only)
+
+
+def walk(top, path_filter=None, include_subdirs=True):
+    if path_filter is not None:
+        return path_filter.walk(top, include_subdirs)
+    if include_subdirs:
+        return os.walk(top)
+    return _walk_top_only(top)
+
+
+def _walk_top_only(top):
+    for root, dirs, files in os.walk(top):
+        dirs[:] = []
+        yield root, dirs, files
@@ -0,0 +1,140 @@
+import errno
+import hashlib
+import json
+import os
+from archive import CHUNK_SIZE
+
+ZEROS = memoryview(bytes(CHUNK_SIZE))
+EXTENTS_ALGORITHM = 'blake2b-extents'
+
+# A sparse file is stored as the concatenation of its data extents; the
+# extents ([offset, length] pairs) and logical size are kept in its manifest
+# entry. Its checksum (algorithm EXTENTS_ALGORITHM) covers the extent map and
+# the stored data, so holes cost nothing to hash.
+
+
+def is_sparse(stat):
+    # st_blocks is in 512-byte units wherever it exists.
+    return getattr(stat, 'st_blocks', None) is not None and stat.st_blocks * 512 < stat.st_size
+
+
+def data_extents(f, size):
+    # Returns the allocated regions of f as [offset, length] pairs, or None if
+    # the platform or filesystem cannot report holes.
+    if not hasattr(os, 'SEEK_DATA'):
+        return None
+    fd = f.fileno()
+    extents = []
+    offset = 0
+    try:
+        while offset < size:
+            try:
+                start = os.lseek(fd, offset, os.SEEK_DATA)
+            except OSError as e:
+                if e.errno == errno.ENXIO:
+                    break
+                raise
+            if start >= size:
+                break
+            end = min(os.lseek(fd, start, os.SEEK_HOLE), size)
+            extents.append([start, end - start])
+            offset = end
+    except OSError:
+        return None
+    finally:
+        os.lseek(fd, 0, os.SEEK_SET)
+    return extents
+
+
+def extent_pieces(chunks, extents):
+    # Splits stored data back along the extent boundaries, yielding
+    # (file offset, data) pairs.
+    chunks = iter(chunks)
+    pending = memoryview(b'')
+    for offset, length in extents:
+        while length:
+            if not pending:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    raise ValueError("Corrupt backup: sparse entry is shorter than its extents")
+                pending = memoryview(chunk)
+            n = min(length, len(pending))
+            yield offset, pending[:n]
+            pending = pending[n:]
+            offset += n
+            length -= n
+
+
+def extents_hasher(extents, size):
+    hasher = hashlib.blake2b()
+    hasher.update(json.dumps({'size': size, 'extents': extents}, separators=(',', ':')).encode('ascii'))
+    return hasher
+
+
+def extents_checksum(chunks, extents, size):
+    hasher = extents_hasher(extents, size)
+    for chunk in chunks:
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def uncovered(extents, covered):
+    # Returns the parts of extents outside covered; both are sorted and disjoint.
+    result = []
+    i = 0
+    for offset, length in extents:
+        end = offset + length
+        while offset < end:
+            while i < len(covered) and covered[i][0] + covered[i][1] <= offset:
+                i += 1
+            if i == len(covered) or covered[i][0] >= end:
+                result.append([offset, end - offset])
+                break
+            if covered[i][0] > offset:
+                result.append([offset, covered[i][0] - offset])
+            offset = covered[i][0] + covered[i][1]
+    return result
+
+
+def _read_range(f, offset, length):
+    f.seek(offset)
+    while length:
+        chunk = f.read(min(CHUNK_SIZE, length))
+        if not chunk:
+            raise OSError(errno.EIO, "file shrank while it was read")
+        yield chunk
+        length -= len(chunk)
+
+
+def file_extents_checksum(path, extents, size):
+    # Hashes a file on disk as a sparse entry with the given extents, reading
+    # only those. Data the filesystem reports outside them (found with
+    # SEEK_DATA) has to be zeros, otherwise the file differs and None is
+    # returned; so does a file of another size.
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size != size:
+            return None
+        current = data_extents(f, size)
+        if current is None:
+            current = [[0, size]]
+        if current != extents:
+            for offset, length in uncovered(current, extents):
+                for chunk in _read_range(f, offset, length):
+                    if chunk != ZEROS[:len(chunk)]:
+                        return None
+        hasher = extents_hasher(extents, size)
+        for offset, length in extents:
+            for chunk in _read_range(f, offset, length):
+                hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def write_extents(out, chunks, extents, size):
+    # Writes only the data extents and leaves the holes unallocated.
+    position = 0
+    for offset, data in extent_pieces(chunks, extents):
+        if offset != position:
+            out.seek(offset)
+        out.write(data)
+        position = offset + len(data)
+    out.truncate(size)
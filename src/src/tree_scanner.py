@@ -0,0 +1,166 @@
+import os
+import logging
+import queue
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtCore import QThread, pyqtSignal
+from metrics import JobMetrics, JobProfiler
+
+# Listing is latency-bound on network shares and cold disks, so more threads than cores pay off.
+SCAN_WORKERS = 8
+# How often finished subtrees are handed to the GUI, in seconds.
+EMIT_INTERVAL = 0.2
+
+FileEntry = namedtuple('FileEntry', ['size', 'mtime'])
+
+
+class TreeNode:
+    # One directory. children maps names to TreeNode or FileEntry and is
+    # assigned once, complete, when the directory has been listed; the
+    # totals cover the whole subtree and are final once done is set.
+    __slots__ = ('name', 'path', 'parent', 'children', 'size', 'files', 'newest', 'pending', 'done', 'error')
+
+    def __init__(self, name, path, parent=None):
+        self.name = name
+        self.path = path
+        self.parent = parent
+        self.children = None
+        self.size = 0
+        self.files = 0
+        self.newest = None
+        self.pending = 0
+        self.done = False
+        self.error = None
+
+
+def list_directory(path):
+    # Returns (subdirectory names, {file name: FileEntry}) without following
+    # symlinks, so linked directories are neither counted twice nor looped into.
+    dirs, files = [], {}
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.name)
+                else:
+                    stat = entry.stat(follow_symlinks=False)
+                    files[entry.name] = FileEntry(stat.st_size, stat.st_mtime)
+            except OSError as e:
+                logging.error(f"Error reading {entry.path}: {e}")
+    return dirs, files
+
+
+class TreeScanner(QThread):
+    subtrees_scanned = pyqtSignal(list)
+    scan_completed = pyqtSignal(object)
+    scan_failed = pyqtSignal(str)
+    job_summary = pyqtSignal(dict)
+
+    def __init__(self, root_dir, path_filter=None, profile=False):
+        super().__init__()
+        self.root_dir = root_dir
+        self.path_filter = path_filter
+        self.profile = profile
+        self.root = TreeNode(os.path.basename(os.path.normpath(root_dir)) or root_dir, root_dir)
+        self.metrics = None
+
+    def run(self):
+        self.metrics = JobMetrics('tree')
+        try:
+            if self.profile:
+                with JobProfiler(self.metrics):
+                    self.scan()
+            else:
+                self.scan()
+            logging.info(f"Scanned {self.root_dir}: {self.root.files} files, {self.root.size} bytes")
+            self.scan_completed.emit(self.root)
+        except Exception as e:
+            self.metrics.count('errors')
+            logging.error(f"Tree scan failed for {self.root_dir}: {e}", exc_info=True)
+            self.scan_failed.emit(str(e))
+        finally:
+            self.metrics.finish()
+            self.metrics.write_json()
+            self.job_summary.emit(self.metrics.summary())
+
+    def scan(self):
+        # Directories are listed in parallel; only this thread touches the
+        # nodes, so totals roll up bottom-up without locking. A directory is
+        # finished when its last subdirectory is, and finished nodes are
+        # streamed to the GUI in batches.
+        results = queue.Queue()
+        changed = []
+        last_emit = time.monotonic()
+        with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as pool:
+            pool.submit(self._list, self.root, [], results)
+            outstanding = 1
+            while outstanding:
+                try:
+                    node, listing, rules, error = results.get(timeout=EMIT_INTERVAL)
+                except queue.Empty:
+                    pass
+                else:
+                    outstanding -= 1
+                    if error is not None:
+                        self.metrics.count('errors')
+                        node.error = str(error)
+                        listing = [], {}, 0, None
+                    outstanding += self._add_listing(node, listing, rules, pool, results, changed)
+                if changed and (not outstanding or time.monotonic() - last_emit >= EMIT_INTERVAL):
+                    self.subtrees_scanned.emit(changed)
+                    changed = []
+                    last_emit = time.monotonic()
+        self.metrics.count('files', self.root.files)
+        self.metrics.count('bytes', self.root.size)
+
+    def _list(self, node, rules, results):
+        # Runs on a pool thread.
+        try:
+            with self.metrics.phase('list'):
+                dirs, files = list_directory(node.path)
+            if self.path_filter is not None:
+                dirs, kept, rules = self.path_filter.filter_listing(self.root_dir, node.path, dirs, list(files), rules)
+                files = {name: files[name] for name in kept}
+            size = sum(entry.size for entry in files.values())
+            newest = max((entry.mtime for entry in files.values()), default=None)
+            results.put((node, (dirs, files, size, newest), rules, None))
+        except Exception as e:
+            # Every listing must report back, or the scan would wait for it forever.
+            logging.error(f"Error listing {node.path}: {e}")
+            results.put((node, None, rules, e))
+
+    def _add_listing(self, node, listing, rules, pool, results, changed):
+        dirs, files, size, newest = listing
+        children = dict(files)
+        for name in dirs:
+            child = TreeNode(name, os.path.join(node.path, name), node)
+            children[name] = child
+            pool.submit(self._list, child, rules, results)
+        node.children = children
+        node.pending = len(dirs)
+        node.files = len(files)
+        node.size = size
+        node.newest = newest
+        self.metrics.count('directories')
+        if dirs:
+            changed.append(node)
+        else:
+            self._finish(node, changed)
+        return len(dirs)
+
+    def _finish(self, node, changed):
+        while node is not None:
+            node.done = True
+            changed.append(node)
+            parent = node.parent
+            if parent is None:
+                return
+            parent.size += node.size
+            parent.files += node.files
+            if node.newest is not None and (parent.newest is None or node.newest > parent.newest):
+                parent.newest = node.newest
+            parent.pending -= 1
+            if parent.pending:
+                return
+            node = parent
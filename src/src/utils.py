@@ -2,9 +2,21 @@ import schedule
 import time
 import os
 import logging
+from change_journal import ChangeWatcher, inotify_available, journal_path_for
 
-def schedule_backup(backup_handler, interval='daily'):
+def schedule_backup(backup_handler, interval='daily', watch_changes=False):
+    # With watch_changes, a change journal kept by an inotify watcher lets each
+    # run skip the full tree scan; the watcher is returned so it can be stopped.
+    watcher = None
     try:
+        if watch_changes and backup_handler.action == 'backup':
+            if inotify_available():
+                backup_handler.journal_path = journal_path_for(backup_handler.backup_path)
+                watcher = ChangeWatcher(backup_handler.journal_path, backup_handler.files,
+                                        backup_handler.include_subdirs, backup_handler.path_filter)
+                watcher.start()
+            else:
+                logging.warning("Change journal needs Linux inotify; scheduled backups will scan the full tree")
         if interval == 'daily':
             schedule.every().day.at("02:00").do(backup_handler.run)
         elif interval == 'weekly':
@@ -13,6 +25,7 @@ def schedule_backup(backup_handler, interval='daily'):
             schedule.every().month.at("02:00").do(backup_handler.run)
     except Exception as e:
         logging.error(f"Error in scheduling backup: {e}", exc_info=True)
+    return watcher
 
 def run_scheduler():
     while True:
@@ -39,26 +52,3 @@ def format_size(size_in_bytes):
     except Exception as e:
         logging.error(f"Error formatting size: {e}", exc_info=True)
         return "Unknown size"
-
-def generate_file_tree(root_dir):
-    try:
-        tree = {}
-        for root, dirs, files in os.walk(root_dir):
-            folder_tree = tree
-            for part in root.split(os.sep):
-                folder_tree = folder_tree.setdefault(part, {})
-            for file in files:
-                folder_tree[file] = None
-        return tree
-    except Exception as e:
-        logging.error(f"Error generating file tree for {root_dir}: {e}", exc_info=True)
-        return {}
-
-def print_file_tree(tree, indent=0):
-    try:
-        for key, value in tree.items():
-            print('  ' * indent + key)
-            if isinstance(value, dict):
-                print_file_tree(value, indent + 1)
-    except Exception as e:
-        logging.error(f"Error printing file tree: {e}", exc_info=True)
@@ -0,0 +1,97 @@
+import io
+import os
+import sys
+import unittest
+from cryptography.fernet import Fernet
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'src'))
+
+from archive import CHUNK_SIZE, ArchiveReader, ArchiveWriter, checksum, read_payload
+
+
+class CountingBytesIO(io.BytesIO):
+    lines = 0
+
+    def readline(self, *args):
+        self.lines += 1
+        return super().readline(*args)
+
+
+class ArchiveRoundTripTest(unittest.TestCase):
+    def test_names_with_control_characters(self):
+        names = ['line\nbreak.txt', 'tricky [3] ---', '"quoted".txt', 'café/\udcff.bin']
+        f = io.BytesIO()
+        writer = ArchiveWriter(f)
+        writer.write_preamble("Backup created on test")
+        for name in names:
+            writer.write_entry(name, name.encode('utf-8', 'surrogateescape'))
+        f.seek(0)
+        frames = [(name, payload) for _, name, _, payload in ArchiveReader(f).frames()]
+        self.assertEqual(frames, [(name, name.encode('utf-8', 'surrogateescape')) for name in names])
+
+    def test_manifest_larger_than_chunk_size(self):
+        manifest = {'files': {f"/data/project/file{i:05d}.txt": {'size': i, 'mtime': 1.5, 'blake2b': 'ab' * 32}
+                              for i in range(9000)}, 'errors': {}}
+        f = io.BytesIO()
+        writer = ArchiveWriter(f)
+        writer.write_preamble("Backup created on test")
+        writer.write_entry('a.txt', b'hello')
+        writer.write_manifest(manifest)
+        self.assertGreater(f.tell(), CHUNK_SIZE)
+        f.seek(0)
+        self.assertEqual(ArchiveReader(f).read_manifest(), manifest)
+
+    def test_manifest_found_without_reading_entries(self):
+        f = CountingBytesIO()
+        writer = ArchiveWriter(f)
+        writer.write_preamble("Backup created on test")
+        for i in range(1000):
+            writer.write_entry(f"file{i}.txt", b'data')
+        manifest = {'files': {}, 'errors': {}}
+        writer.write_manifest(manifest)
+        writer.write_entry('after', b'ignored')
+        f.seek(0)
+        self.assertIsNone(ArchiveReader(f).read_manifest())
+        f.seek(-len(b'--- "after" [7] ---\nignored\n'), io.SEEK_END)
+        f.truncate()
+        f.seek(0)
+        f.lines = 0
+        self.assertEqual(ArchiveReader(f).read_manifest(), manifest)
+        self.assertLess(f.lines, 10)
+
+    def test_large_entry_payload(self):
+        data = os.urandom(CHUNK_SIZE * 2 + 123)
+        f = io.BytesIO()
+        writer = ArchiveWriter(f)
+        writer.write_preamble("Backup created on test")
+        writer.write_entry('big.bin', data)
+        f.seek(0)
+        frames = [(name, checksum(read_payload(payload))) for _, name, _, payload in ArchiveReader(f).frames()]
+        self.assertEqual(frames, [('big.bin', checksum(data))])
+
+    def test_legacy_archive(self):
+        f = io.BytesIO(b"Backup created on test\n\n--- a.txt ---\none\ntwo\n--- b.txt ---\nno newline--- c.txt ---\n")
+        reader = ArchiveReader(f)
+        self.assertIsNone(reader.read_manifest())
+        frames = [(name, payload) for _, name, _, payload in reader.frames()]
+        self.assertEqual(frames, [('a.txt', b'one\ntwo\n'), ('b.txt', b'no newline'), ('c.txt', b'')])
+
+    def test_legacy_comment_banner(self):
+        helpers = b"import os\n# --- helpers ---\ndef f():\n    pass  # --- end ---\n"
+        f = io.BytesIO(b"Backup created on test\n\n--- src/a.py ---\n" + helpers
+                       + b"--- src/b.py ---\nx = 1--- src/c.py ---\nok\n")
+        frames = [(name, payload) for _, name, _, payload in ArchiveReader(f).frames()]
+        self.assertEqual(frames, [('src/a.py', helpers), ('src/b.py', b'x = 1'), ('src/c.py', b'ok\n')])
+
+    def test_legacy_encrypted_archive(self):
+        fernet = Fernet(Fernet.generate_key())
+        tokens = [b"Backup created on test\n\n", b"--- a.txt ---\n", b"hello", b"--- b.txt ---\n", b""]
+        f = io.BytesIO(b''.join(fernet.encrypt(token) for token in tokens))
+        reader = ArchiveReader(f, fernet)
+        self.assertIsNone(reader.read_manifest())
+        frames = [(name, payload) for _, name, _, payload in reader.frames()]
+        self.assertEqual(frames, [('a.txt', b'hello'), ('b.txt', b'')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,219 @@
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+import zipfile
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'src'))
+
+from cryptography.fernet import Fernet
+
+import backup_restore
+from backup_restore import BackupRestoreHandler
+from checkpoint import CheckpointLog, backup_checkpoint_path, restore_checkpoint_path
+
+
+class SimulatedCrash(Exception):
+    pass
+
+
+class CrashingHandler(BackupRestoreHandler):
+    # Fails once a backup has added crash_after files to its manifest, or when
+    # a restore reaches its crash_after + 1'th entry.
+    crash_after = None
+
+    def _add_to_manifest(self, file_path, info):
+        super()._add_to_manifest(file_path, info)
+        if self.crash_after is not None and len(self._manifest['files']) == self.crash_after:
+            raise SimulatedCrash(file_path)
+
+    def _restore_path(self, file_path):
+        if self.crash_after is not None:
+            if self.crash_after == 0:
+                raise SimulatedCrash(file_path)
+            self.crash_after -= 1
+        return super()._restore_path(file_path)
+
+
+class ResumeTest(unittest.TestCase):
+    key = None
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.root)
+        interval = backup_restore.CHECKPOINT_INTERVAL
+        self.addCleanup(setattr, backup_restore, 'CHECKPOINT_INTERVAL', interval)
+        backup_restore.CHECKPOINT_INTERVAL = 0
+        self.archive = os.path.join(self.root, 'backup.txt')
+        self.restore_dir = os.path.join(self.root, 'restored')
+
+    def handler(self, action, cls=BackupRestoreHandler, **kwargs):
+        return cls(action, encryption_key=self.key, **kwargs)
+
+    def make_source(self):
+        rng = random.Random(0)
+        os.makedirs(os.path.join('src', 'sub'))
+        self.source = {}
+        for i in range(12):
+            path = f"src/sub/f{i:02d}.bin" if i % 2 else f"src/f{i:02d}.bin"
+            data = rng.randbytes(rng.choice([10, 5000, 1536 * 1024]))
+            with open(path, 'wb') as f:
+                f.write(data)
+            self.source[path] = data
+
+    def assert_restored(self):
+        for path, data in self.source.items():
+            with open(os.path.join(self.restore_dir, path), 'rb') as f:
+                self.assertEqual(f.read(), data, path)
+
+    def interrupted_backup(self, crash_after):
+        self.make_source()
+        handler = self.handler('backup', CrashingHandler, files=['src'], backup_path=self.archive, include_subdirs=True)
+        handler.crash_after = crash_after
+        self.assertEqual(len(self.run_handler(handler)), 1)
+        self.assertTrue(os.path.exists(backup_checkpoint_path(self.archive)))
+
+    def interrupted_restore(self, crash_after):
+        self.make_source()
+        self.assertEqual(self.run_handler(self.handler('backup', files=['src'], backup_path=self.archive,
+                                                       include_subdirs=True)), [])
+        handler = self.handler('restore', CrashingHandler, backup_file=self.archive, restore_dir=self.restore_dir)
+        handler.crash_after = crash_after
+        self.assertEqual(len(self.run_handler(handler)), 1)
+
+    def load_restore_checkpoint(self):
+        handler = self.handler('resume_restore', restore_dir=self.restore_dir)
+        handler._checkpoints = CheckpointLog(restore_checkpoint_path(self.restore_dir))
+        return handler._load_restore_checkpoint()
+
+    def run_handler(self, handler):
+        failures = []
+        for signal in (handler.backup_failed, handler.restore_failed):
+            signal.connect(failures.append)
+        handler.run()
+        return failures
+
+    def test_resume_after_sparse_entry(self):
+        os.makedirs('src')
+        with open(os.path.join('src', 'a.img'), 'wb') as f:
+            f.write(b'a' * 4096)
+            f.truncate(8 << 20)
+        with open(os.path.join('src', 'b.txt'), 'wb') as f:
+            f.write(b'b' * 100)
+        self.assertEqual(self.run_handler(self.handler('backup', files=['src/a.img', 'src/b.txt'], backup_path=self.archive)), [])
+        handler = self.handler('restore', CrashingHandler, backup_file=self.archive, restore_dir=self.restore_dir)
+        handler.crash_after = 1
+        self.assertEqual(len(self.run_handler(handler)), 1)
+
+        record = self.load_restore_checkpoint()
+        self.assertIsNotNone(record)
+        self.assertEqual(record['entries'], 1)
+        self.assertEqual(record['last_size'], 8 << 20)
+        self.assertEqual(self.run_handler(self.handler('resume_restore', restore_dir=self.restore_dir)), [])
+        with open(os.path.join(self.restore_dir, 'src', 'b.txt'), 'rb') as f:
+            self.assertEqual(f.read(), b'b' * 100)
+        self.assertEqual(os.path.getsize(os.path.join(self.restore_dir, 'src', 'a.img')), 8 << 20)
+
+    def test_restore_into_missing_directory(self):
+        os.makedirs('src')
+        with open(os.path.join('src', 'a.txt'), 'wb') as f:
+            f.write(b'hello')
+        self.assertEqual(self.run_handler(self.handler('backup', files=['src/a.txt'], backup_path=self.archive)), [])
+        self.assertEqual(self.run_handler(self.handler('restore', backup_file=self.archive, restore_dir=self.restore_dir)), [])
+        with open(os.path.join(self.restore_dir, 'src', 'a.txt'), 'rb') as f:
+            self.assertEqual(f.read(), b'hello')
+
+    def test_resume_backup(self):
+        self.interrupted_backup(5)
+        # A torn frame written after the last checkpoint is cut off on resume.
+        with open(self.archive, 'ab') as f:
+            f.write(b'partial frame')
+        self.assertEqual(self.run_handler(self.handler('resume_backup', backup_path=self.archive)), [])
+        self.assertFalse(os.path.exists(backup_checkpoint_path(self.archive)))
+        self.assertEqual(self.run_handler(self.handler('restore', backup_file=self.archive, restore_dir=self.restore_dir)), [])
+        self.assert_restored()
+
+    def test_last_valid_checkpoint(self):
+        self.interrupted_backup(5)
+        handler = self.handler('resume_backup', backup_path=self.archive)
+        _, records = CheckpointLog(backup_checkpoint_path(self.archive)).load()
+        self.assertGreater(len(records), 2)
+        with open(self.archive, 'r+b') as f:
+            self.assertEqual(handler._last_valid_checkpoint(f, records), len(records) - 1)
+            # Damage the data before the last checkpoint; an earlier one still matches.
+            f.seek(records[-1]['offset'] - 1)
+            f.write(b'!')
+            f.truncate(records[-1]['offset'])
+            self.assertEqual(handler._last_valid_checkpoint(f, records), len(records) - 2)
+            f.truncate(0)
+            self.assertIsNone(handler._last_valid_checkpoint(f, records))
+
+    def test_resume_restore(self):
+        self.interrupted_restore(5)
+        record = self.load_restore_checkpoint()
+        self.assertEqual(record['entries'], 5)
+        self.assertEqual(self.run_handler(self.handler('resume_restore', restore_dir=self.restore_dir)), [])
+        self.assertFalse(os.path.exists(restore_checkpoint_path(self.restore_dir)))
+        self.assert_restored()
+
+    def test_restore_checkpoint_with_changed_last_file(self):
+        self.interrupted_restore(5)
+        _, records = CheckpointLog(restore_checkpoint_path(self.restore_dir)).load()
+        with open(records[-1]['last_path'], 'ab') as f:
+            f.write(b'changed')
+        self.assertEqual(self.load_restore_checkpoint()['entries'], records[-2]['entries'])
+        self.assertEqual(self.run_handler(self.handler('resume_restore', restore_dir=self.restore_dir)), [])
+        self.assert_restored()
+
+
+class EncryptedResumeTest(ResumeTest):
+    key = Fernet.generate_key()
+
+    def test_resume_with_wrong_key(self):
+        self.interrupted_backup(5)
+        size = os.path.getsize(self.archive)
+        handler = BackupRestoreHandler('resume_backup', backup_path=self.archive, encryption_key=Fernet.generate_key())
+        self.assertEqual(len(self.run_handler(handler)), 1)
+        self.assertEqual(os.path.getsize(self.archive), size)
+
+
+class ZipRestoreTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(self.root)
+        self.archive = os.path.join(self.root, 'backup.zip')
+        self.restore_dir = os.path.join(self.root, 'restored')
+        with zipfile.ZipFile(self.archive, 'w') as zf:
+            zf.writestr('/abs/a.txt', b'absolute')
+            zf.writestr('../up.txt', b'parent')
+            zf.writestr('dir/b.txt', b'plain')
+
+    def restore(self):
+        handler = BackupRestoreHandler('restore', backup_file=self.archive, restore_dir=self.restore_dir,
+                                       skip_identical=True)
+        messages = []
+        handler.file_processed.connect(messages.append)
+        handler.run()
+        return messages
+
+    def test_member_names_are_sanitized(self):
+        messages = self.restore()
+        for name, data in (('abs/a.txt', b'absolute'), ('up.txt', b'parent'), ('dir/b.txt', b'plain')):
+            path = os.path.join(self.restore_dir, name)
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), data)
+            self.assertTrue(any(message.startswith(path + ' (') for message in messages))
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'up.txt')))
+        messages = self.restore()
+        self.assertEqual(len([message for message in messages if message.startswith('Unchanged, skipped: ')]), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'src'))
+
+from change_journal import CHANGED, ChangeJournal, journal_job
+
+
+class CompactedJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.src = os.path.join(self.root, 'src')
+        os.makedirs(self.src)
+        self.paths = [os.path.join(self.src, name) for name in ('a.txt', 'b.txt', 'c.txt')]
+        for path in self.paths:
+            with open(path, 'w') as f:
+                f.write(path)
+        self.job = journal_job([self.src], True, None)
+        self.journal = ChangeJournal(os.path.join(self.root, 'backup.txt.journal'))
+
+    def write_journal(self, header, paths):
+        with open(self.journal.path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(dict(header, type='journal', **self.job)) + '\n')
+            for path in paths:
+                f.write(json.dumps([CHANGED, path]) + '\n')
+
+    def write_baseline(self, journal_id, offset):
+        self.journal.write_baseline(self.job, (journal_id, offset), [(self.paths[0], os.stat(self.paths[0]))])
+
+    def test_baseline_from_before_compaction(self):
+        # Taken exactly where the compacted journal continues, so every event in it is new.
+        self.write_journal({'id': 'new', 'continues': 'old', 'continues_at': 100}, [self.paths[1], self.paths[2]])
+        self.write_baseline('old', 100)
+        position, scanned = self.journal.work_list(self.job)
+        self.assertEqual(position, self.journal.position(self.job))
+        self.assertEqual(sorted(path for path, _ in scanned), self.paths)
+
+    def test_baseline_after_the_compaction_point_skips_consumed_events(self):
+        self.write_journal({'id': 'new', 'continues': 'old', 'continues_at': 100}, [self.paths[1], self.paths[2]])
+        with open(self.journal.path, 'rb') as f:
+            f.readline()
+            first_event = len(f.readline())
+        self.write_baseline('old', 100 + first_event)
+        _, scanned = self.journal.work_list(self.job)
+        self.assertEqual(sorted(path for path, _ in scanned), [self.paths[0], self.paths[2]])
+
+    def test_events_dropped_by_compaction_force_a_rescan(self):
+        self.write_journal({'id': 'new', 'continues': 'old', 'continues_at': 100}, [self.paths[2]])
+        self.write_baseline('old', 60)
+        self.assertIsNone(self.journal.work_list(self.job))
+        self.write_baseline('older', 100)
+        self.assertIsNone(self.journal.work_list(self.job))
+
+
+if __name__ == '__main__':
+    unittest.main()
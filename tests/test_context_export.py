@@ -0,0 +1,63 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'src'))
+
+from context_export import BYTES_PER_TOKEN, OMITTED_LIST_LIMIT, ContextExporter
+from metrics import JobMetrics
+
+
+class ContextExportBudgetTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        for i in range(400):
+            with open(os.path.join(self.root, f"module_{i:03d}.py"), 'w') as f:
+                f.write(f"# module {i}\n" + "value = 'café'\n" * (50 + i * 7))
+        for i in range(300):
+            with open(os.path.join(self.root, f"blob_{i:03d}.bin"), 'wb') as f:
+                f.write(b'\0' * 100)
+
+    def export(self, max_total_bytes, max_file_bytes=4000, **kwargs):
+        output_path = os.path.join(self.root, 'context.txt')
+        exporter = ContextExporter([self.root], output_path, max_file_bytes=max_file_bytes,
+                                   max_total_bytes=max_total_bytes, **kwargs)
+        exporter.metrics = JobMetrics('export')
+        exporter.export()
+        with open(output_path, encoding='utf-8') as f:
+            return os.path.getsize(output_path), f.read()
+
+    def test_output_stays_within_budget(self):
+        for budget in (1000, 40000, 150000):
+            size, text = self.export(budget)
+            self.assertLessEqual(size, budget)
+            self.assertIn("--- omitted files ---\n", text)
+            self.assertIn(" more\n", text)
+            listed = text.split("--- omitted files ---\n")[1].count('\n') - 1
+            self.assertLessEqual(listed, OMITTED_LIST_LIMIT)
+
+    def test_omitted_files_are_listed(self):
+        for budget in (40000, 150000):
+            size, text = self.export(budget)
+            lines = text.split("--- omitted files ---\n")[1].splitlines()
+            self.assertEqual(len(lines), OMITTED_LIST_LIMIT + 1)
+            self.assertTrue(lines[0].startswith(self.root))
+            self.assertTrue(lines[-1].endswith(" more"))
+
+    def test_per_file_token_budget(self):
+        size, text = self.export(150000, max_file_bytes=None, max_file_tokens=100)
+        for entry in text.split("\n--- ")[1:-1]:
+            content = entry.split(" ---\n", 1)[1].split("[... truncated ")[0]
+            self.assertLessEqual(len(content.encode('utf-8')), 100 * BYTES_PER_TOKEN + 1)
+        self.assertIn("[... truncated ", text)
+
+    def test_truncated_file_is_marked(self):
+        size, text = self.export(150000)
+        self.assertIn("[... truncated ", text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'src'))
+
+from path_filter import PathFilter, compile_pattern
+
+
+def matches(pattern, path):
+    return compile_pattern(pattern).regex.match(path) is not None
+
+
+class CompilePatternTest(unittest.TestCase):
+    def test_blank_and_comment_lines(self):
+        self.assertIsNone(compile_pattern(''))
+        self.assertIsNone(compile_pattern('# comment'))
+        self.assertTrue(matches('\\#notes', '#notes'))
+
+    def test_anchoring(self):
+        self.assertTrue(matches('*.log', 'a.log'))
+        self.assertTrue(matches('*.log', 'deep/dir/a.log'))
+        self.assertTrue(matches('/build', 'build'))
+        self.assertFalse(matches('/build', 'src/build'))
+        self.assertTrue(matches('docs/*.md', 'docs/a.md'))
+        self.assertFalse(matches('docs/*.md', 'src/docs/a.md'))
+        self.assertFalse(matches('docs/*.md', 'docs/sub/a.md'))
+
+    def test_double_star(self):
+        self.assertTrue(matches('**/cache', 'cache'))
+        self.assertTrue(matches('**/cache', 'a/b/cache'))
+        self.assertTrue(matches('logs/**', 'logs/a/b.txt'))
+        self.assertFalse(matches('logs/**', 'logs'))
+        self.assertTrue(matches('a/**/z', 'a/z'))
+        self.assertTrue(matches('a/**/z', 'a/b/c/z'))
+        self.assertFalse(matches('a/**/z', 'b/a/z'))
+
+    def test_wildcards_and_classes(self):
+        self.assertTrue(matches('file?.txt', 'file1.txt'))
+        self.assertFalse(matches('file?.txt', 'file/.txt'))
+        self.assertTrue(matches('[ab].txt', 'a.txt'))
+        self.assertFalse(matches('[!ab].txt', 'a.txt'))
+        self.assertTrue(matches('[!ab].txt', 'c.txt'))
+
+    def test_flags(self):
+        rule = compile_pattern('!build/')
+        self.assertTrue(rule.negate)
+        self.assertTrue(rule.dir_only)
+        self.assertFalse(compile_pattern('build').dir_only)
+
+
+class PathFilterWalkTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        for path in ['a.py', 'a.log', 'keep.log', 'build/out.o', 'src/b.py', 'src/b.log', 'src/build',
+                     'src/sub/c.py', 'src/sub/c.tmp', 'node_modules/x/index.js']:
+            self.write(path)
+
+    def write(self, path, text=''):
+        path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def walked(self, path_filter, include_subdirs=True):
+        found = []
+        for root, _, files in path_filter.walk(self.root, include_subdirs):
+            rel_root = os.path.relpath(root, self.root)
+            found.extend(name if rel_root == '.' else f"{rel_root}/{name}".replace(os.sep, '/') for name in files)
+        return sorted(found)
+
+    def test_dir_only_patterns(self):
+        found = self.walked(PathFilter(exclude=['build/']))
+        self.assertNotIn('build/out.o', found)
+        self.assertIn('src/build', found)
+
+    def test_include_patterns(self):
+        self.assertEqual(self.walked(PathFilter(include=['*.py'])), ['a.py', 'src/b.py', 'src/sub/c.py'])
+
+    def test_negation(self):
+        found = self.walked(PathFilter(exclude=['*.log', '!keep.log']))
+        self.assertNotIn('a.log', found)
+        self.assertNotIn('src/b.log', found)
+        self.assertIn('keep.log', found)
+
+    def test_nested_gitignore(self):
+        self.write('.gitignore', '*.log\n!keep.log\n')
+        self.write('src/.gitignore', '/sub/*.tmp\n')
+        self.write('src/sub/.gitignore', '!*.log\n')
+        self.write('src/sub/d.log')
+        found = self.walked(PathFilter(use_gitignore=True))
+        self.assertNotIn('a.log', found)
+        self.assertIn('keep.log', found)
+        self.assertNotIn('src/b.log', found)
+        self.assertNotIn('src/sub/c.tmp', found)
+        self.assertIn('src/sub/c.py', found)
+        self.assertIn('src/sub/d.log', found)
+
+    def test_nested_gitignore_rules_are_relative(self):
+        self.write('src/.gitignore', '/b.py\n')
+        found = self.walked(PathFilter(use_gitignore=True))
+        self.assertNotIn('src/b.py', found)
+        self.assertIn('a.py', found)
+
+    def test_excludes_win_over_gitignore_negations(self):
+        self.write('.gitignore', '!keep.log\n')
+        found = self.walked(PathFilter(exclude=['*.log'], use_gitignore=True))
+        self.assertNotIn('keep.log', found)
+
+    def test_excluded_directories_are_not_listed(self):
+        listed = []
+        scandir = os.scandir
+
+        def recording_scandir(path):
+            listed.append(os.path.relpath(path, self.root))
+            return scandir(path)
+
+        with mock.patch('os.scandir', recording_scandir):
+            found = self.walked(PathFilter(exclude=['node_modules/', 'build/']))
+        self.assertNotIn('node_modules/x/index.js', found)
+        self.assertNotIn('node_modules', listed)
+        self.assertNotIn(os.path.join('node_modules', 'x'), listed)
+        self.assertNotIn('build', listed)
+        self.assertIn('src', listed)
+
+    def test_top_directory_only(self):
+        self.assertEqual(self.walked(PathFilter(exclude=['*.log']), include_subdirs=False), ['a.py'])
+
+
+if __name__ == '__main__':
+    unittest.main()
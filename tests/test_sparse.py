@@ -0,0 +1,50 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'src'))
+
+from sparse import extents_checksum, file_extents_checksum, uncovered
+
+
+class SparseChecksumTest(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.path = os.path.join(self.root, 'disk.img')
+        with open(self.path, 'wb') as f:
+            f.write(b'a' * 4096)
+            f.seek(1 << 20)
+            f.write(b'b' * 4096)
+            f.truncate(4 << 20)
+        self.extents = [[0, 4096], [1 << 20, 4096]]
+        self.size = 4 << 20
+        self.digest = extents_checksum([b'a' * 4096, b'b' * 4096], self.extents, self.size)
+
+    def test_uncovered(self):
+        self.assertEqual(uncovered([[0, 100], [200, 50]], [[10, 20], [40, 10], [210, 100]]),
+                         [[0, 10], [30, 10], [50, 50], [200, 10]])
+        self.assertEqual(uncovered([[0, 10]], []), [[0, 10]])
+        self.assertEqual(uncovered([[0, 10]], [[0, 10]]), [])
+
+    def test_file_matches_stored_extents(self):
+        self.assertEqual(file_extents_checksum(self.path, self.extents, self.size), self.digest)
+        self.assertEqual(extents_checksum([b'a' * 4096 + b'b' * 4096], self.extents, self.size), self.digest)
+
+    def test_zeros_written_into_a_hole_still_match(self):
+        with open(self.path, 'r+b') as f:
+            f.seek(2 << 20)
+            f.write(bytes(4096))
+        self.assertEqual(file_extents_checksum(self.path, self.extents, self.size), self.digest)
+
+    def test_data_written_into_a_hole_differs(self):
+        with open(self.path, 'r+b') as f:
+            f.seek(2 << 20)
+            f.write(b'x')
+        self.assertIsNone(file_extents_checksum(self.path, self.extents, self.size))
+
+
+if __name__ == '__main__':
+    unittest.main()